@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------------
+"""
+Control Flow Graph
+
+Recursive descent disassembly from a set of entry points. Only the code that
+is reachable from the entry points is decoded, so literal pools and other
+data between functions are never mistaken for instructions.
+"""
+# -----------------------------------------------------------------------------
+
+import da
+
+# -----------------------------------------------------------------------------
+
+class block(object):
+  """a basic block"""
+
+  def __init__(self, start):
+    self.start = start
+    self.end = start
+    # (adr, opcode, mnemonic id, operands, length)
+    self.insns = []
+    # successor block addresses
+    self.succs = []
+    # call targets
+    self.calls = []
+    # control flow type of the last instruction
+    self.flow = da.FLOW_NONE
+
+  def __str__(self):
+    succs = ' '.join(['%08x' % x for x in self.succs])
+    return '%08x-%08x: %d insns -> %s' % (self.start, self.end - 1, len(self.insns), (succs, '-')[len(succs) == 0])
+
+# -----------------------------------------------------------------------------
+
+class cfg(object):
+  """control flow graph for the code in a memory buffer"""
+
+  def __init__(self, buf, base):
+    """
+    buf = byte string, bytearray or buffer
+    base = address of buf[0]
+    """
+    self.mem = bytearray(buf)
+    self.base = base
+    self.end = base + len(self.mem)
+    # decoded instructions: adr -> (adr, opcode, mnemonic id, operands, length)
+    self.insns = {}
+    # block start addresses
+    self.leaders = set()
+    # function entry points
+    self.functions = set()
+    # basic blocks: start adr -> block
+    self.blocks = {}
+
+  def decode(self, adr):
+    """decode the instruction at adr - or None if it is not in the buffer"""
+    i = adr - self.base
+    k = len(self.mem) - i
+    if i < 0 or k <= 0:
+      return None
+    mem = self.mem
+    if k >= 3:
+      opcode = mem[i] | (mem[i + 1] << 8) | (mem[i + 2] << 16)
+    elif k == 2:
+      opcode = mem[i] | (mem[i + 1] << 8)
+    else:
+      opcode = mem[i]
+    (mid, operands, length) = da.da_decode(opcode, adr)
+    if length > k:
+      return None
+    return (adr, opcode & ((1 << (length * 8)) - 1), mid, operands, length)
+
+  def explore(self, entries, follow_calls = True):
+    """decode the code reachable from the entry points, then build the basic blocks"""
+    work = list(entries)
+    self.functions.update(work)
+    self.leaders.update(work)
+    while work:
+      adr = work.pop()
+      # decode until the flow of control leaves the straight line
+      while not self.insns.has_key(adr):
+        x = self.decode(adr)
+        if x is None:
+          break
+        self.insns[adr] = x
+        (flow, target) = da.da_flow(x[2], x[3])
+        adr += x[4]
+        if flow == da.FLOW_BRANCH:
+          self.leaders.add(target)
+          self.leaders.add(adr)
+          work.append(target)
+        elif flow == da.FLOW_JUMP:
+          self.leaders.add(target)
+          work.append(target)
+          break
+        elif flow == da.FLOW_CALL:
+          if follow_calls and self.base <= target < self.end and target not in self.functions:
+            self.functions.add(target)
+            self.leaders.add(target)
+            work.append(target)
+        elif flow in (da.FLOW_JUMPX, da.FLOW_RETURN, da.FLOW_HALT):
+          break
+    self.build_blocks()
+
+  def build_blocks(self):
+    """split the decoded instructions into basic blocks"""
+    self.blocks = {}
+    b = None
+    for adr in sorted(self.insns):
+      x = self.insns[adr]
+      if b is None or adr != b.end or adr in self.leaders or b.flow not in (da.FLOW_NONE, da.FLOW_CALL, da.FLOW_CALLX):
+        b = block(adr)
+        self.blocks[adr] = b
+      b.insns.append(x)
+      b.end = adr + x[4]
+      (b.flow, target) = da.da_flow(x[2], x[3])
+      if b.flow == da.FLOW_CALL:
+        b.calls.append(target)
+    # link the blocks
+    for b in self.blocks.itervalues():
+      (flow, target) = da.da_flow(b.insns[-1][2], b.insns[-1][3])
+      if flow in (da.FLOW_BRANCH, da.FLOW_JUMP):
+        b.succs.append(target)
+      if flow in (da.FLOW_NONE, da.FLOW_BRANCH, da.FLOW_CALL, da.FLOW_CALLX) and self.insns.has_key(b.end):
+        b.succs.append(b.end)
+
+  def function_blocks(self, entry):
+    """return the sorted blocks reachable from entry without following calls"""
+    seen = set()
+    work = [entry]
+    while work:
+      adr = work.pop()
+      if adr in seen or not self.blocks.has_key(adr):
+        continue
+      seen.add(adr)
+      work.extend(self.blocks[adr].succs)
+    return [self.blocks[adr] for adr in sorted(seen)]
+
+# -----------------------------------------------------------------------------
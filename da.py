@@ -4,6 +4,13 @@ Disassembler for the Xtensa ISA
 """
 #------------------------------------------------------------------------------
 
+import array
+import bisect
+import collections
+import multiprocessing
+
+#------------------------------------------------------------------------------
+
 def sex(x, n):
     """sign extend n-bit value x"""
     m = 1 << (n - 1)
@@ -110,11 +117,6 @@ def get_b4const(opcode):
 def get_b4constu(opcode):
     return (32768,65536,2,3,4,5,6,7,8,10,12,16,32,64,128,256)[get_r(opcode)]
 
-#------------------------------------------------------------------------------
-
-def emit_reserved3(opcode, pc):
-    return ('reserved', 3)
-
 #------------------------------------------------------------------------------
 # special registers
 
@@ -243,722 +245,893 @@ def get_sr(opcode, rd = True):
         return _sregs[sreg_wr(x)]
     return '?'
 
+#------------------------------------------------------------------------------
+# operand formats
+# (template, extractor): the extractor returns the operand tuple for the
+# template. Formatting is deferred until the instruction is displayed.
+# This is the hot path, so the common fields are extracted inline.
+
+_none = ('', lambda opcode, pc: ())
+_unknown = ('?', lambda opcode, pc: ())
+_imm_s = ('%d', lambda opcode, pc: ((opcode >> 8) & 15,))
+_as = ('a%d', lambda opcode, pc: ((opcode >> 8) & 15,))
+_at_as = ('a%d, a%d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15))
+_ar_at = ('a%d, a%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 4) & 15))
+_ar_as = ('a%d, a%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15))
+_ar_as_at = ('a%d, a%d, a%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15, (opcode >> 4) & 15))
+_fr_fs = ('f%d, f%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15))
+_fr_fs_ft = ('f%d, f%d, f%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15, (opcode >> 4) & 15))
+_movi_n = ('a%d, %d', lambda opcode, pc: ((opcode >> 8) & 15, get_imm7s(opcode)))
+_movi = ('a%d, 0x%x', lambda opcode, pc: ((opcode >> 4) & 15, get_imm12s_rri8(opcode)))
+_addi = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, get_imm8s(opcode)))
+_addmi = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, get_imm8s(opcode) << 8))
+_addi_n = ('a%d, a%d, a%d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15, get_imm_addi_n(opcode)))
+_at_as_imm8 = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, (opcode >> 16) & 255))
+_at_as_imm8x2 = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, ((opcode >> 16) & 255) << 1))
+_at_as_imm8x4 = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, ((opcode >> 16) & 255) << 2))
+_at_as_imm4x4 = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, get_imm4u(opcode) << 2))
+_x32e = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15, get_imm_x32e(opcode)))
+_l32r = ('a%d, 0x%08x', lambda opcode, pc: ((opcode >> 4) & 15, get_imm16_ri16(opcode) + ((pc + 3) & ~3)))
+_slli = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 8) & 15, get_imm_slli(opcode)))
+_srli = ('a%d, a%d, %d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 4) & 15, (opcode >> 8) & 15))
+_extui = ('a%d, a%d, %d, %d', lambda opcode, pc: ((opcode >> 12) & 15, (opcode >> 4) & 15, get_shiftimm(opcode), get_op2(opcode) + 1))
+_rsr = ('a%d, %s', lambda opcode, pc: ((opcode >> 4) & 15, get_sr(opcode, True)))
+_wsr = ('a%d, %s', lambda opcode, pc: ((opcode >> 4) & 15, get_sr(opcode, False)))
+_rsil = ('a%d, %d', lambda opcode, pc: ((opcode >> 4) & 15, (opcode >> 8) & 15))
+_rotw = ('%d', lambda opcode, pc: (get_imm4s(opcode),))
+_break = ('%d, %d', lambda opcode, pc: ((opcode >> 8) & 15, (opcode >> 4) & 15))
+_entry = ('a%d, %d', lambda opcode, pc: ((opcode >> 8) & 15, get_imm12u_bri12(opcode) << 3))
+_target18 = ('0x%08x', lambda opcode, pc: (get_imm18s(opcode) + pc + 4,))
+_call = ('0x%08x', lambda opcode, pc: ((pc & ~3) + (get_imm18s(opcode) << 2) + 4,))
+_as_target6 = ('a%d, 0x%08x', lambda opcode, pc: ((opcode >> 8) & 15, get_imm6u(opcode) + pc + 4))
+_as_target12 = ('a%d, 0x%08x', lambda opcode, pc: ((opcode >> 8) & 15, get_imm12s_bri12(opcode) + pc + 4))
+_as_at_target8 = ('a%d, a%d, 0x%08x', lambda opcode, pc: ((opcode >> 8) & 15, (opcode >> 4) & 15, get_imm8s(opcode) + pc + 4))
+_as_bit_target8 = ('a%d, %d, 0x%08x', lambda opcode, pc: ((opcode >> 8) & 15, get_imm4u_rri8(opcode), get_imm8s(opcode) + pc + 4))
+_as_b4const_target8 = ('a%d, %d, 0x%08x', lambda opcode, pc: ((opcode >> 8) & 15, get_b4const(opcode), get_imm8s(opcode) + pc + 4))
+
+#------------------------------------------------------------------------------
+# decode table construction
+
+# opcode fields used to select decode table entries: name -> (shift, width)
+_fields = {
+    'op0': (0, 4),
+    't': (4, 4),
+    'n': (4, 2),
+    'm': (6, 2),
+    's': (8, 4),
+    'r': (12, 4),
+    'op1': (16, 4),
+    'op2': (20, 4),
+}
+
+def _op(name, fmt = _none, length = 3):
+    """an instruction: (mnemonic, operand format, opcode length)"""
+    return (name, fmt, length)
+
+def _table(field, entries):
+    """a decode table: entries are selected by the opcode field"""
+    assert len(entries) == 1 << _fields[field][1]
+    return (field, entries)
+
+_reserved = _op('reserved')
+
 #------------------------------------------------------------------------------
 # Section 7.3.1 - opcode decode maps
 
 # Table 240 - select with t
-map_s3 = (
-    lambda opcode, pc: ('ret.n', 2),
-    lambda opcode, pc: ('retw.n', 2),
-    lambda opcode, pc: ('break.n %d' % get_s(opcode), 2),
-    lambda opcode, pc: ('nop.n', 2),
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ill.n', 2),
-    emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_s3) == 16
+map_s3 = _table('t', (
+    _op('ret.n', length = 2),
+    _op('retw.n', length = 2),
+    _op('break.n', _imm_s, length = 2),
+    _op('nop.n', length = 2),
+    _reserved, _reserved,
+    _op('ill.n', length = 2),
+    _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 239 - select with r
-map_st3 = (
-    lambda opcode, pc: ('mov.n a%d, a%d' % (get_t(opcode), get_s(opcode)), 2),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: map_s3[get_t(opcode)](opcode, pc),
-)
-assert len(map_st3) == 16
-
-# Table 238 - select with t
-map_st2 = (
-    lambda opcode, pc: ('movi.n a%d, %d' % (get_s(opcode), get_imm7s(opcode)), 2),
-    lambda opcode, pc: ('movi.n a%d, %d' % (get_s(opcode), get_imm7s(opcode)), 2),
-    lambda opcode, pc: ('beqz.n a%d, 0x%08x' % (get_s(opcode), get_imm6u(opcode) + pc + 4), 2),
-    lambda opcode, pc: ('bnez.n a%d, 0x%08x' % (get_s(opcode), get_imm6u(opcode) + pc + 4), 2),
-)
-assert len(map_st2) == 4
+map_st3 = _table('r', (
+    _op('mov.n', _at_as, length = 2),
+    _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved,
+    map_s3,
+))
+
+# Table 238 - select with t[3:2]
+map_st2 = _table('m', (
+    _op('movi.n', _movi_n, length = 2),
+    _op('movi.n', _movi_n, length = 2),
+    _op('beqz.n', _as_target6, length = 2),
+    _op('bnez.n', _as_target6, length = 2),
+))
 
 # Table 237 - select from r
-map_b = (
-    lambda opcode, pc: ('bnone a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('beq a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('blt a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bltu a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('ball a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbc a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbci a%d, %d, 0x%08x' % (get_s(opcode), get_imm4u_rri8(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbci a%d, %d, 0x%08x' % (get_s(opcode), get_imm4u_rri8(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bany a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bne a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bge a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bgeu a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bnall a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbs a%d, a%d, 0x%08x' % (get_s(opcode), get_t(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbsi a%d, %d, 0x%08x' % (get_s(opcode), get_imm4u_rri8(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bbsi a%d, %d, 0x%08x' % (get_s(opcode), get_imm4u_rri8(opcode), get_imm8s(opcode) + pc + 4), 3),
-)
-assert len(map_b) == 16
+map_b = _table('r', (
+    _op('bnone', _as_at_target8),
+    _op('beq', _as_at_target8),
+    _op('blt', _as_at_target8),
+    _op('bltu', _as_at_target8),
+    _op('ball', _as_at_target8),
+    _op('bbc', _as_at_target8),
+    _op('bbci', _as_bit_target8),
+    _op('bbci', _as_bit_target8),
+    _op('bany', _as_at_target8),
+    _op('bne', _as_at_target8),
+    _op('bge', _as_at_target8),
+    _op('bgeu', _as_at_target8),
+    _op('bnall', _as_at_target8),
+    _op('bbs', _as_at_target8),
+    _op('bbsi', _as_bit_target8),
+    _op('bbsi', _as_bit_target8),
+))
 
 # Table 236 - select with r
-map_b1 = (
-    lambda opcode, pc: ('bfp ?', 3),
-    lambda opcode, pc: ('btp ?', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('loop ?', 3),
-    lambda opcode, pc: ('loopnez ?', 3),
-    lambda opcode, pc: ('loopgtz ?', 3),
-    emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_b1) == 16
+map_b1 = _table('r', (
+    _op('bfp', _unknown),
+    _op('btp', _unknown),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _op('loop', _unknown),
+    _op('loopnez', _unknown),
+    _op('loopgtz', _unknown),
+    _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 235 - select with m
-map_bi1 = (
-    lambda opcode, pc: ('entry a%d, %d' % (get_s(opcode), get_imm12u_bri12(opcode) << 3), 3),
-    lambda opcode, pc: map_b1[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: ('bltui a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bgeui a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-)
-assert len(map_bi1) == 4
+map_bi1 = _table('m', (
+    _op('entry', _entry),
+    map_b1,
+    _op('bltui', _as_b4const_target8),
+    _op('bgeui', _as_b4const_target8),
+))
 
 # Table 234 - select with m
-map_bi0 = (
-    lambda opcode, pc: ('beqi a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bnei a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('blti a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bgei a%d, %d, 0x%08x' % (get_s(opcode), get_b4const(opcode), get_imm8s(opcode) + pc + 4), 3),
-)
-assert len(map_bi0) == 4
+map_bi0 = _table('m', (
+    _op('beqi', _as_b4const_target8),
+    _op('bnei', _as_b4const_target8),
+    _op('blti', _as_b4const_target8),
+    _op('bgei', _as_b4const_target8),
+))
 
 # Table 233 - select with m
-map_bz = (
-    lambda opcode, pc: ('beqz a%d, 0x%08x' % (get_s(opcode), get_imm12s_bri12(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bnez a%d, 0x%08x' % (get_s(opcode), get_imm12s_bri12(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bltz a%d, 0x%08x' % (get_s(opcode), get_imm12s_bri12(opcode) + pc + 4), 3),
-    lambda opcode, pc: ('bgez a%d, 0x%08x' % (get_s(opcode), get_imm12s_bri12(opcode) + pc + 4), 3),
-)
-assert len(map_bz) == 4
+map_bz = _table('m', (
+    _op('beqz', _as_target12),
+    _op('bnez', _as_target12),
+    _op('bltz', _as_target12),
+    _op('bgez', _as_target12),
+))
 
 # Table 232 - select with n
-map_si = (
-    lambda opcode, pc: ('j 0x%08x' % (get_imm18s(opcode) + pc + 4), 3),
-    lambda opcode, pc: map_bz[get_m(opcode)](opcode, pc),
-    lambda opcode, pc: map_bi0[get_m(opcode)](opcode, pc),
-    lambda opcode, pc: map_bi1[get_m(opcode)](opcode, pc),
-)
-assert len(map_si) == 4
+map_si = _table('n', (
+    _op('j', _target18),
+    map_bz,
+    map_bi0,
+    map_bi1,
+))
 
 # Table 231 - select with n
-map_calln = (
-    lambda opcode, pc: ('call0 ?', 3),
-    lambda opcode, pc: ('call4 ?', 3),
-    lambda opcode, pc: ('call8 ?', 3),
-    lambda opcode, pc: ('call12 ?', 3),
-)
-assert len(map_calln) == 4
+map_calln = _table('n', (
+    _op('call0', _call),
+    _op('call4', _call),
+    _op('call8', _call),
+    _op('call12', _call),
+))
 
 # Table 230 - select with op1
-map_macc = (
-    lambda opcode, pc: ('lddec ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_macc) == 16
+map_macc = _table('op1', (
+    _op('lddec', _unknown),
+    _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 229 - select with op1
-map_maci = (
-    lambda opcode, pc: ('ldinc ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_maci) == 16
+map_maci = _table('op1', (
+    _op('ldinc', _unknown),
+    _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 228 - select with op1
-map_macaa = (
-    lambda opcode, pc: ('umul.aa.ll ?', 3),
-    lambda opcode, pc: ('umul.aa.hl ?', 3),
-    lambda opcode, pc: ('umul.aa.lh ?', 3),
-    lambda opcode, pc: ('umul.aa.hh ?', 3),
-    lambda opcode, pc: ('mul.aa.ll ?', 3),
-    lambda opcode, pc: ('mul.aa.hl ?', 3),
-    lambda opcode, pc: ('mul.aa.lh ?', 3),
-    lambda opcode, pc: ('mul.aa.hh ?', 3),
-    lambda opcode, pc: ('mula.aa.ll ?', 3),
-    lambda opcode, pc: ('mula.aa.hl ?', 3),
-    lambda opcode, pc: ('mula.aa.lh ?', 3),
-    lambda opcode, pc: ('mula.aa.hh ?', 3),
-    lambda opcode, pc: ('muls.aa.ll ?', 3),
-    lambda opcode, pc: ('muls.aa.hl ?', 3),
-    lambda opcode, pc: ('muls.aa.lh ?', 3),
-    lambda opcode, pc: ('muls.aa.hh ?', 3),
-)
-assert len(map_macaa) == 16
+map_macaa = _table('op1', (
+    _op('umul.aa.ll', _unknown),
+    _op('umul.aa.hl', _unknown),
+    _op('umul.aa.lh', _unknown),
+    _op('umul.aa.hh', _unknown),
+    _op('mul.aa.ll', _unknown),
+    _op('mul.aa.hl', _unknown),
+    _op('mul.aa.lh', _unknown),
+    _op('mul.aa.hh', _unknown),
+    _op('mula.aa.ll', _unknown),
+    _op('mula.aa.hl', _unknown),
+    _op('mula.aa.lh', _unknown),
+    _op('mula.aa.hh', _unknown),
+    _op('muls.aa.ll', _unknown),
+    _op('muls.aa.hl', _unknown),
+    _op('muls.aa.lh', _unknown),
+    _op('muls.aa.hh', _unknown),
+))
 
 # Table 227 - select with op1
-map_macda = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mul.da.ll ?', 3),
-    lambda opcode, pc: ('mul.da.hl ?', 3),
-    lambda opcode, pc: ('mul.da.lh ?', 3),
-    lambda opcode, pc: ('mul.da.hh ?', 3),
-    lambda opcode, pc: ('mula.da.ll ?', 3),
-    lambda opcode, pc: ('mula.da.hl ?', 3),
-    lambda opcode, pc: ('mula.da.lh ?', 3),
-    lambda opcode, pc: ('mula.da.hh ?', 3),
-    lambda opcode, pc: ('muls.da.ll ?', 3),
-    lambda opcode, pc: ('muls.da.hl ?', 3),
-    lambda opcode, pc: ('muls.da.lh ?', 3),
-    lambda opcode, pc: ('muls.da.hh ?', 3),
-)
-assert len(map_macda) == 16
+map_macda = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mul.da.ll', _unknown),
+    _op('mul.da.hl', _unknown),
+    _op('mul.da.lh', _unknown),
+    _op('mul.da.hh', _unknown),
+    _op('mula.da.ll', _unknown),
+    _op('mula.da.hl', _unknown),
+    _op('mula.da.lh', _unknown),
+    _op('mula.da.hh', _unknown),
+    _op('muls.da.ll', _unknown),
+    _op('muls.da.hl', _unknown),
+    _op('muls.da.lh', _unknown),
+    _op('muls.da.hh', _unknown),
+))
 
 # Table 226 - select with op1
-map_macca = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mula.da.ll.lddec ?', 3),
-    lambda opcode, pc: ('mula.da.hl.lddec ?', 3),
-    lambda opcode, pc: ('mula.da.lh.lddec ?', 3),
-    lambda opcode, pc: ('mula.da.hh.lddec ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_macca) == 16
+map_macca = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mula.da.ll.lddec', _unknown),
+    _op('mula.da.hl.lddec', _unknown),
+    _op('mula.da.lh.lddec', _unknown),
+    _op('mula.da.hh.lddec', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 225 - select with op1
-map_maccd = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mula.dd.ll.lddec ?', 3),
-    lambda opcode, pc: ('mula.dd.hl.lddec ?', 3),
-    lambda opcode, pc: ('mula.dd.lh.lddec ?', 3),
-    lambda opcode, pc: ('mula.dd.hh.lddec ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_maccd) == 16
+map_maccd = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mula.dd.ll.lddec', _unknown),
+    _op('mula.dd.hl.lddec', _unknown),
+    _op('mula.dd.lh.lddec', _unknown),
+    _op('mula.dd.hh.lddec', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 224 - select with op1
-map_macad = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mul.ad.ll ?', 3),
-    lambda opcode, pc: ('mul.ad.hl ?', 3),
-    lambda opcode, pc: ('mul.ad.lh ?', 3),
-    lambda opcode, pc: ('mul.ad.hh ?', 3),
-    lambda opcode, pc: ('mula.ad.ll ?', 3),
-    lambda opcode, pc: ('mula.ad.hl ?', 3),
-    lambda opcode, pc: ('mula.ad.lh ?', 3),
-    lambda opcode, pc: ('mula.ad.hh ?', 3),
-    lambda opcode, pc: ('muls.ad.ll ?', 3),
-    lambda opcode, pc: ('muls.ad.hl ?', 3),
-    lambda opcode, pc: ('muls.ad.lh ?', 3),
-    lambda opcode, pc: ('muls.ad.hh ?', 3),
-)
-assert len(map_macad) == 16
+map_macad = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mul.ad.ll', _unknown),
+    _op('mul.ad.hl', _unknown),
+    _op('mul.ad.lh', _unknown),
+    _op('mul.ad.hh', _unknown),
+    _op('mula.ad.ll', _unknown),
+    _op('mula.ad.hl', _unknown),
+    _op('mula.ad.lh', _unknown),
+    _op('mula.ad.hh', _unknown),
+    _op('muls.ad.ll', _unknown),
+    _op('muls.ad.hl', _unknown),
+    _op('muls.ad.lh', _unknown),
+    _op('muls.ad.hh', _unknown),
+))
 
 # Table 223 - select with op1
-map_macdd = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mul.dd.ll ?', 3),
-    lambda opcode, pc: ('mul.dd.hl ?', 3),
-    lambda opcode, pc: ('mul.dd.lh ?', 3),
-    lambda opcode, pc: ('mul.dd.hh ?', 3),
-    lambda opcode, pc: ('mula.dd.ll ?', 3),
-    lambda opcode, pc: ('mula.dd.hl ?', 3),
-    lambda opcode, pc: ('mula.dd.lh ?', 3),
-    lambda opcode, pc: ('mula.dd.hh ?', 3),
-    lambda opcode, pc: ('muls.dd.ll ?', 3),
-    lambda opcode, pc: ('muls.dd.hl ?', 3),
-    lambda opcode, pc: ('muls.dd.lh ?', 3),
-    lambda opcode, pc: ('muls.dd.hh ?', 3),
-)
-assert len(map_macdd) == 16
+map_macdd = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mul.dd.ll', _unknown),
+    _op('mul.dd.hl', _unknown),
+    _op('mul.dd.lh', _unknown),
+    _op('mul.dd.hh', _unknown),
+    _op('mula.dd.ll', _unknown),
+    _op('mula.dd.hl', _unknown),
+    _op('mula.dd.lh', _unknown),
+    _op('mula.dd.hh', _unknown),
+    _op('muls.dd.ll', _unknown),
+    _op('muls.dd.hl', _unknown),
+    _op('muls.dd.lh', _unknown),
+    _op('muls.dd.hh', _unknown),
+))
 
 # Table 222 - select with op1
-map_macia = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mula.da.ll.ldinc ?', 3),
-    lambda opcode, pc: ('mula.da.hl.ldinc ?', 3),
-    lambda opcode, pc: ('mula.da.lh.ldinc ?', 3),
-    lambda opcode, pc: ('mula.da.hh.ldinc ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_macia) == 16
+map_macia = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mula.da.ll.ldinc', _unknown),
+    _op('mula.da.hl.ldinc', _unknown),
+    _op('mula.da.lh.ldinc', _unknown),
+    _op('mula.da.hh.ldinc', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 221 - select with op1
-map_macid = (
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mula.dd.ll.ldinc ?', 3),
-    lambda opcode, pc: ('mula.dd.hl.ldinc ?', 3),
-    lambda opcode, pc: ('mula.dd.lh.ldinc ?', 3),
-    lambda opcode, pc: ('mula.dd.hh.ldinc ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_macid) == 16
+map_macid = _table('op1', (
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _op('mula.dd.ll.ldinc', _unknown),
+    _op('mula.dd.hl.ldinc', _unknown),
+    _op('mula.dd.lh.ldinc', _unknown),
+    _op('mula.dd.hh.ldinc', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 220 - select with op2
-map_mac16 = (
-    lambda opcode, pc: map_macid[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_maccd[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macdd[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macad[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macia[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macca[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macda[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macaa[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_maci[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: map_macc[get_op1(opcode)](opcode, pc),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_mac16) == 16
+map_mac16 = _table('op2', (
+    map_macid,
+    map_maccd,
+    map_macdd,
+    map_macad,
+    map_macia,
+    map_macca,
+    map_macda,
+    map_macaa,
+    map_maci,
+    map_macc,
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 219 - select with r
-map_lsci = (
-    lambda opcode, pc: ('lsif ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ssif ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('lsiuf ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ssiu ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_lsci) == 16
+map_lsci = _table('r', (
+    _op('lsif', _unknown),
+    _reserved, _reserved, _reserved,
+    _op('ssif', _unknown),
+    _reserved, _reserved, _reserved,
+    _op('lsiuf', _unknown),
+    _reserved, _reserved, _reserved,
+    _op('ssiu', _unknown),
+    _reserved, _reserved, _reserved,
+))
 
 # Table 218 - select with op1
-map_ice = (
-    lambda opcode, pc: ('ipfll ?', 3),
-    emit_reserved3,
-    lambda opcode, pc: ('ihul ?', 3),
-    lambda opcode, pc: ('iiul ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_ice) == 16
+map_ice = _table('op1', (
+    _op('ipfll', _unknown),
+    _reserved,
+    _op('ihul', _unknown),
+    _op('iiul', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 217 - select with op1
-map_dce = (
-    lambda opcode, pc: ('dpfll ?', 3),
-    emit_reserved3,
-    lambda opcode, pc: ('dhul ?', 3),
-    lambda opcode, pc: ('diul ?', 3),
-    lambda opcode, pc: ('diwbc ?', 3),
-    lambda opcode, pc: ('diwbic ?', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_dce) == 16
+map_dce = _table('op1', (
+    _op('dpfll', _unknown),
+    _reserved,
+    _op('dhul', _unknown),
+    _op('diul', _unknown),
+    _op('diwbc', _unknown),
+    _op('diwbic', _unknown),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 216 - select with t
-map_cache = (
-    lambda opcode, pc: ('dpfrc ?', 3),
-    lambda opcode, pc: ('dpfwc ?', 3),
-    lambda opcode, pc: ('dpfroc ?', 3),
-    lambda opcode, pc: ('dpfwoc ?', 3),
-    lambda opcode, pc: ('dhwbc ?', 3),
-    lambda opcode, pc: ('dhwbic ?', 3),
-    lambda opcode, pc: ('dhic ?', 3),
-    lambda opcode, pc: ('diic ?', 3),
-    lambda opcode, pc: ('dcec ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ipfc ?', 3),
-    lambda opcode, pc: ('icec ?', 3),
-    lambda opcode, pc: ('ihic ?', 3),
-    lambda opcode, pc: ('iiic ?', 3),
-)
-assert len(map_cache) == 16
+map_cache = _table('t', (
+    _op('dpfrc', _unknown),
+    _op('dpfwc', _unknown),
+    _op('dpfroc', _unknown),
+    _op('dpfwoc', _unknown),
+    _op('dhwbc', _unknown),
+    _op('dhwbic', _unknown),
+    _op('dhic', _unknown),
+    _op('diic', _unknown),
+    _op('dcec', _unknown),
+    _reserved, _reserved, _reserved,
+    _op('ipfc', _unknown),
+    _op('icec', _unknown),
+    _op('ihic', _unknown),
+    _op('iiic', _unknown),
+))
 
 # Table 215 - select with r
-map_lsai = (
-    lambda opcode, pc: ('l8ui a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode)), 3),
-    lambda opcode, pc: ('l16ui a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 1), 3),
-    lambda opcode, pc: ('l32i a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 2), 3),
-    emit_reserved3,
-    lambda opcode, pc: ('s8i a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode)), 3),
-    lambda opcode, pc: ('s16i a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 1), 3),
-    lambda opcode, pc: ('s32i a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 2), 3),
-    lambda opcode, pc: map_cache[get_t(opcode)](opcode, pc),
-    emit_reserved3,
-    lambda opcode, pc: ('l16si a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 1), 3),
-    lambda opcode, pc: ('movi a%d, 0x%x' % (get_t(opcode), get_imm12s_rri8(opcode)), 3),
-    lambda opcode, pc: ('l32ai a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 2), 3),
-    lambda opcode, pc: ('addi a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8s(opcode)), 3),
-    lambda opcode, pc: ('addmi a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8s(opcode) << 8), 3),
-    lambda opcode, pc: ('s32c1i a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 2), 3),
-    lambda opcode, pc: ('s32ri a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm8u(opcode) << 2), 3),
-)
-assert len(map_lsai) == 16
+map_lsai = _table('r', (
+    _op('l8ui', _at_as_imm8),
+    _op('l16ui', _at_as_imm8x2),
+    _op('l32i', _at_as_imm8x4),
+    _reserved,
+    _op('s8i', _at_as_imm8),
+    _op('s16i', _at_as_imm8x2),
+    _op('s32i', _at_as_imm8x4),
+    map_cache,
+    _reserved,
+    _op('l16si', _at_as_imm8x2),
+    _op('movi', _movi),
+    _op('l32ai', _at_as_imm8x4),
+    _op('addi', _addi),
+    _op('addmi', _addmi),
+    _op('s32c1i', _at_as_imm8x4),
+    _op('s32ri', _at_as_imm8x4),
+))
 
 # Table 214 - select with op2
-map_fp1 = (
-    emit_reserved3,
-    lambda opcode, pc: ('un.sf ?', 3),
-    lambda opcode, pc: ('oeq.sf ?', 3),
-    lambda opcode, pc: ('ueq.sf ?', 3),
-    lambda opcode, pc: ('olt.sf ?', 3),
-    lambda opcode, pc: ('ult.sf ?', 3),
-    lambda opcode, pc: ('ole.sf ?', 3),
-    lambda opcode, pc: ('ule.sf ?', 3),
-    lambda opcode, pc: ('moveqz.sf ?', 3),
-    lambda opcode, pc: ('movnez.sf ?', 3),
-    lambda opcode, pc: ('movltz.sf ?', 3),
-    lambda opcode, pc: ('movgez.sf ?', 3),
-    lambda opcode, pc: ('movf.sf ?', 3),
-    lambda opcode, pc: ('movt.sf ?', 3),
-    emit_reserved3, emit_reserved3,
-)
-assert len(map_fp1) == 16
+map_fp1 = _table('op2', (
+    _reserved,
+    _op('un.sf', _unknown),
+    _op('oeq.sf', _unknown),
+    _op('ueq.sf', _unknown),
+    _op('olt.sf', _unknown),
+    _op('ult.sf', _unknown),
+    _op('ole.sf', _unknown),
+    _op('ule.sf', _unknown),
+    _op('moveqz.sf', _unknown),
+    _op('movnez.sf', _unknown),
+    _op('movltz.sf', _unknown),
+    _op('movgez.sf', _unknown),
+    _op('movf.sf', _unknown),
+    _op('movt.sf', _unknown),
+    _reserved, _reserved,
+))
 
 # Table 213 - select with t
-map_fp1op = (
-    lambda opcode, pc: ('mov.s f%d, f%d' % (get_r(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('abs.s f%d, f%d' % (get_r(opcode), get_s(opcode)), 3),
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('rfr f%d, f%d' % (get_r(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('wfr f%d, f%d' % (get_r(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('neg.s f%d, f%d' % (get_r(opcode), get_s(opcode)), 3),
-    emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_fp1op) == 16
+map_fp1op = _table('t', (
+    _op('mov.s', _fr_fs),
+    _op('abs.s', _fr_fs),
+    _reserved, _reserved,
+    _op('rfr', _fr_fs),
+    _op('wfr', _fr_fs),
+    _op('neg.s', _fr_fs),
+    _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 212 - select with op2
-map_fp0 = (
-    lambda opcode, pc: ('add.s f%d, f%d, f%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('sub.s f%d, f%d, f%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('mul.s f%d, f%d, f%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    emit_reserved3,
-    lambda opcode, pc: ('madd.s f%d, f%d, f%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('msub.s f%d, f%d, f%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('round.s ?', 3),
-    lambda opcode, pc: ('trunc.s ?', 3),
-    lambda opcode, pc: ('floor.s ?', 3),
-    lambda opcode, pc: ('ceil.s ?', 3),
-    lambda opcode, pc: ('float.s ?', 3),
-    lambda opcode, pc: ('ufloat.s ?', 3),
-    lambda opcode, pc: ('utrunc.s ?', 3),
-    lambda opcode, pc: map_fp1op[get_t(opcode)](opcode, pc),
-)
-assert len(map_fp0) == 16
+map_fp0 = _table('op2', (
+    _op('add.s', _fr_fs_ft),
+    _op('sub.s', _fr_fs_ft),
+    _op('mul.s', _fr_fs_ft),
+    _reserved,
+    _op('madd.s', _fr_fs_ft),
+    _op('msub.s', _fr_fs_ft),
+    _reserved, _reserved,
+    _op('round.s', _unknown),
+    _op('trunc.s', _unknown),
+    _op('floor.s', _unknown),
+    _op('ceil.s', _unknown),
+    _op('float.s', _unknown),
+    _op('ufloat.s', _unknown),
+    _op('utrunc.s', _unknown),
+    map_fp1op,
+))
 
 # Table 211 - select with op2
-map_lsc4 = (
-    lambda opcode, pc: ('l32e a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm_x32e(opcode)), 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('s32e a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm_x32e(opcode)), 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_lsc4) == 16
+map_lsc4 = _table('op2', (
+    _op('l32e', _x32e),
+    _reserved, _reserved, _reserved,
+    _op('s32e', _x32e),
+    _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 210 - select with op2
-map_lscx = (
-    lambda opcode, pc: ('lsxf ?', 3),
-    lambda opcode, pc: ('lsxuf ?', 3),
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ssxf ?', 3),
-    lambda opcode, pc: ('ssxuf ?', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_lscx) == 16
+map_lscx = _table('op2', (
+    _op('lsxf', _unknown),
+    _op('lsxuf', _unknown),
+    _reserved, _reserved,
+    _op('ssxf', _unknown),
+    _op('ssxuf', _unknown),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 209 - select with op2
-map_rst3 = (
-    lambda opcode, pc: ('rsr a%d, %s' % (get_t(opcode), get_sr(opcode, True)), 3),
-    lambda opcode, pc: ('wsr a%d, %s' % (get_t(opcode), get_sr(opcode, False)), 3),
-    lambda opcode, pc: ('sextu ?', 3),
-    lambda opcode, pc: ('clampsu ?', 3),
-    lambda opcode, pc: ('minu ?', 3),
-    lambda opcode, pc: ('maxu ?', 3),
-    lambda opcode, pc: ('minuu ?', 3),
-    lambda opcode, pc: ('maxuu ?', 3),
-    lambda opcode, pc: ('moveqz ?', 3),
-    lambda opcode, pc: ('movnez ?', 3),
-    lambda opcode, pc: ('movltz ?', 3),
-    lambda opcode, pc: ('movg ?', 3),
-    lambda opcode, pc: ('movfp ?', 3),
-    lambda opcode, pc: ('movtp ?', 3),
-    lambda opcode, pc: ('rur ?', 3),
-    lambda opcode, pc: ('wur ?', 3),
-)
-assert len(map_rst3) == 16
+map_rst3 = _table('op2', (
+    _op('rsr', _rsr),
+    _op('wsr', _wsr),
+    _op('sextu', _unknown),
+    _op('clampsu', _unknown),
+    _op('minu', _unknown),
+    _op('maxu', _unknown),
+    _op('minuu', _unknown),
+    _op('maxuu', _unknown),
+    _op('moveqz', _unknown),
+    _op('movnez', _unknown),
+    _op('movltz', _unknown),
+    _op('movg', _unknown),
+    _op('movfp', _unknown),
+    _op('movtp', _unknown),
+    _op('rur', _unknown),
+    _op('wur', _unknown),
+))
 
 # Table 208 - select with op2
-map_rst2 = (
-    lambda opcode, pc: ('andbp ?', 3),
-    lambda opcode, pc: ('andbcp ?', 3),
-    lambda opcode, pc: ('orbp ?', 3),
-    lambda opcode, pc: ('orbcp ?', 3),
-    lambda opcode, pc: ('xorbp ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('mulli ?', 3),
-    emit_reserved3,
-    lambda opcode, pc: ('muluhi ?', 3),
-    lambda opcode, pc: ('mulshi ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_rst2) == 16
+map_rst2 = _table('op2', (
+    _op('andbp', _unknown),
+    _op('andbcp', _unknown),
+    _op('orbp', _unknown),
+    _op('orbcp', _unknown),
+    _op('xorbp', _unknown),
+    _reserved, _reserved, _reserved,
+    _op('mulli', _unknown),
+    _reserved,
+    _op('muluhi', _unknown),
+    _op('mulshi', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 207 - select with t
-map_rfdx = (
-    lambda opcode, pc: ('rfdo %d' % get_s(opcode), 3),
-    lambda opcode, pc: ('rfdd', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_rfdx) == 16
+map_rfdx = _table('t', (
+    _op('rfdo', _imm_s),
+    _op('rfdd'),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 206 - select with r
-map_imp = (
-    lambda opcode, pc: ('lict ?', 3),
-    lambda opcode, pc: ('sict ?', 3),
-    lambda opcode, pc: ('licw ?', 3),
-    lambda opcode, pc: ('sicw ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ldct ?', 3),
-    lambda opcode, pc: ('sdct ?', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: map_rfdx[get_t(opcode)](opcode, pc),
-    emit_reserved3,
-)
-assert len(map_imp) == 16
+map_imp = _table('r', (
+    _op('lict', _unknown),
+    _op('sict', _unknown),
+    _op('licw', _unknown),
+    _op('sicw', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+    _op('ldct', _unknown),
+    _op('sdct', _unknown),
+    _reserved, _reserved,
+    _reserved, _reserved,
+    map_rfdx,
+    _reserved,
+))
 
 # Table 205 - select with op2
-map_rst1 = (
-    lambda opcode, pc: ('slli a%d, a%d, %d' % (get_r(opcode), get_s(opcode), get_imm_slli(opcode)), 3),
-    lambda opcode, pc: ('slli a%d, a%d, %d' % (get_r(opcode), get_s(opcode), get_imm_slli(opcode)), 3),
-    lambda opcode, pc: ('srai ?', 3),
-    lambda opcode, pc: ('srai ?', 3),
-    lambda opcode, pc: ('srli a%d, a%d, %d' % (get_r(opcode), get_t(opcode), get_s(opcode)), 3),
-    emit_reserved3,
-    lambda opcode, pc: ('xsr a%d, %s' % (get_t(opcode), get_sr(opcode)), 3),
-    emit_reserved3,
-    lambda opcode, pc: ('src a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('srl a%d, a%d' % (get_r(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('sll a%d, a%d' % (get_r(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('sra a%d, a%d' % (get_r(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('mul16u a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('mul16s a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    emit_reserved3,
-    lambda opcode, pc: map_imp[get_r(opcode)](opcode, pc),
-)
-assert len(map_rst1) == 16
+map_rst1 = _table('op2', (
+    _op('slli', _slli),
+    _op('slli', _slli),
+    _op('srai', _unknown),
+    _op('srai', _unknown),
+    _op('srli', _srli),
+    _reserved,
+    _op('xsr', _rsr),
+    _reserved,
+    _op('src', _ar_as_at),
+    _op('srl', _ar_at),
+    _op('sll', _ar_as),
+    _op('sra', _ar_at),
+    _op('mul16u', _ar_as_at),
+    _op('mul16s', _ar_as_at),
+    _reserved,
+    map_imp,
+))
 
 # Table 204 - select with s
-map_rt0 = (
-    lambda opcode, pc: ('neg ?', 3),
-    lambda opcode, pc: ('abs ?', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_rt0) == 16
+map_rt0 = _table('s', (
+    _op('neg', _unknown),
+    _op('abs', _unknown),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 203 - select with r
-map_tlb = (
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('ritlb0 a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('iitlb a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('pitlb a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('witlb a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('ritlb1 a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('rdtlb0 a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('idtlb a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('pdtlb a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('wdtlb a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('rdtlb1 a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-)
-assert len(map_tlb) == 16
+map_tlb = _table('r', (
+    _reserved, _reserved, _reserved,
+    _op('ritlb0', _at_as),
+    _op('iitlb', _as),
+    _op('pitlb', _at_as),
+    _op('witlb', _at_as),
+    _op('ritlb1', _at_as),
+    _reserved, _reserved, _reserved,
+    _op('rdtlb0', _at_as),
+    _op('idtlb', _as),
+    _op('pdtlb', _at_as),
+    _op('wdtlb', _at_as),
+    _op('rdtlb1', _at_as),
+))
 
 # Table 202 - select with r
-map_st1 = (
-    lambda opcode, pc: ('ssr a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('ssl a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('ssa8l a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('ssa8b a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('ssai ?', 3),
-    emit_reserved3,
-    lambda opcode, pc: ('rer a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('wer a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('rotw %d' % get_imm4s(opcode), 3),
-    emit_reserved3,emit_reserved3,emit_reserved3,
-    emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('nsa a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('nsau a%d, a%d' % (get_t(opcode), get_s(opcode)), 3),
-)
-assert len(map_st1) == 16
+map_st1 = _table('r', (
+    _op('ssr', _as),
+    _op('ssl', _as),
+    _op('ssa8l', _as),
+    _op('ssa8b', _as),
+    _op('ssai', _unknown),
+    _reserved,
+    _op('rer', _at_as),
+    _op('wer', _at_as),
+    _op('rotw', _rotw),
+    _reserved,_reserved,_reserved,
+    _reserved, _reserved,
+    _op('nsa', _at_as),
+    _op('nsau', _at_as),
+))
 
 # Table 201 - select with s
-map_rfet = (
-    lambda opcode, pc: ('rfe', 3),
-    lambda opcode, pc: ('rfue', 3),
-    lambda opcode, pc: ('rfde', 3),
-    emit_reserved3,
-    lambda opcode, pc: ('rfwo', 3),
-    lambda opcode, pc: ('rfwu', 3),
-    emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_rfet) == 16
+map_rfet = _table('s', (
+    _op('rfe'),
+    _op('rfue'),
+    _op('rfde'),
+    _reserved,
+    _op('rfwo'),
+    _op('rfwu'),
+    _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 200 - select with t
-map_rfei = (
-
-    lambda opcode, pc: map_rfet[get_s(opcode)](opcode, pc),
-    lambda opcode, pc: ('rfi %d' % get_s(opcode), 3),
-    lambda opcode, pc: ('rfme', 3),
-    emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_rfei) == 16
+map_rfei = _table('t', (
+
+    map_rfet,
+    _op('rfi', _imm_s),
+    _op('rfme'),
+    _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 199 - select with t
-map_sync = (
-    lambda opcode, pc: ('isync', 3),
-    lambda opcode, pc: ('rsync', 3),
-    lambda opcode, pc: ('esync', 3),
-    lambda opcode, pc: ('dsync', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('excw', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3,
-    lambda opcode, pc: ('memw', 3),
-    lambda opcode, pc: ('extw', 3),
-    emit_reserved3, emit_reserved3,
-)
-assert len(map_sync) == 16
+map_sync = _table('t', (
+    _op('isync'),
+    _op('rsync'),
+    _op('esync'),
+    _op('dsync'),
+    _reserved, _reserved, _reserved, _reserved,
+    _op('excw'),
+    _reserved, _reserved, _reserved,
+    _op('memw'),
+    _op('extw'),
+    _reserved, _reserved,
+))
 
 # Table 198 - select from n
-map_callx = (
-    lambda opcode, pc: ('callx0 a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('callx4 a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('callx8 a%d' % get_s(opcode), 3),
-    lambda opcode, pc: ('callx12 a%d' % get_s(opcode), 3),
-)
-assert len(map_callx) == 4
+map_callx = _table('n', (
+    _op('callx0', _as),
+    _op('callx4', _as),
+    _op('callx8', _as),
+    _op('callx12', _as),
+))
 
 # Table 197 - select from n
-map_jr = (
-    lambda opcode, pc: ('ret', 3),
-    lambda opcode, pc: ('retw', 3),
-    lambda opcode, pc: ('jx a%d' % get_s(opcode), 3),
-    emit_reserved3,
-)
-assert len(map_jr) == 4
+map_jr = _table('n', (
+    _op('ret'),
+    _op('retw'),
+    _op('jx', _as),
+    _reserved,
+))
 
 # Table 196 - select with m
-map_snm0 = (
-    lambda opcode, pc: ('ill', 3),
-    emit_reserved3,
-    lambda opcode, pc: map_jr[get_n(opcode)](opcode, pc),
-    lambda opcode, pc: map_callx[get_n(opcode)](opcode, pc),
-)
-assert len(map_snm0) == 4
+map_snm0 = _table('m', (
+    _op('ill'),
+    _reserved,
+    map_jr,
+    map_callx,
+))
 
 # Table 195 - select from r
-map_st0 = (
-    lambda opcode, pc: map_snm0[get_m(opcode)](opcode, pc),
-    lambda opcode, pc: ('movsp ?', 3),
-    lambda opcode, pc: map_sync[get_t(opcode)](opcode, pc),
-    lambda opcode, pc: map_rfei[get_t(opcode)](opcode, pc),
-    lambda opcode, pc: ('break %d, %d' % (get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('syscall', 3),
-    lambda opcode, pc: ('rsil a%d, %d' % (get_t(opcode), get_s(opcode)), 3),
-    lambda opcode, pc: ('waiti %d' % get_s(opcode), 3),
-    lambda opcode, pc: ('any4 ?', 3),
-    lambda opcode, pc: ('all4 ?', 3),
-    lambda opcode, pc: ('any8 ?', 3),
-    lambda opcode, pc: ('all8 ?', 3),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_st0) == 16
+map_st0 = _table('r', (
+    map_snm0,
+    _op('movsp', _unknown),
+    map_sync,
+    map_rfei,
+    _op('break', _break),
+    _op('syscall'),
+    _op('rsil', _rsil),
+    _op('waiti', _imm_s),
+    _op('any4', _unknown),
+    _op('all4', _unknown),
+    _op('any8', _unknown),
+    _op('all8', _unknown),
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 194 - select op2
-map_rst0 = (
-    lambda opcode, pc: map_st0[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: ('and a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('or a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('xor a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: map_st1[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: map_tlb[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: map_rt0[get_s(opcode)](opcode, pc),
-    emit_reserved3,
-    lambda opcode, pc: ('add a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('addx2 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('addx4 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('addx8 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('sub a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('subx2 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('subx4 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-    lambda opcode, pc: ('subx8 a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 3),
-)
-assert len(map_rst0) == 16
+map_rst0 = _table('op2', (
+    map_st0,
+    _op('and', _ar_as_at),
+    _op('or', _ar_as_at),
+    _op('xor', _ar_as_at),
+    map_st1,
+    map_tlb,
+    map_rt0,
+    _reserved,
+    _op('add', _ar_as_at),
+    _op('addx2', _ar_as_at),
+    _op('addx4', _ar_as_at),
+    _op('addx8', _ar_as_at),
+    _op('sub', _ar_as_at),
+    _op('subx2', _ar_as_at),
+    _op('subx4', _ar_as_at),
+    _op('subx8', _ar_as_at),
+))
 
 # Table 193 - select with op1
-map_qrst = (
-    lambda opcode, pc: map_rst0[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_rst1[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_rst2[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_rst3[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: ('extui a%d, a%d, %d, %d' % (get_r(opcode), get_t(opcode), get_shiftimm(opcode), get_op2(opcode) + 1), 3),
-    lambda opcode, pc: ('extui a%d, a%d, %d, %d' % (get_r(opcode), get_t(opcode), get_shiftimm(opcode), get_op2(opcode) + 1), 3),
-    lambda opcode, pc: ('cust0', 3),
-    lambda opcode, pc: ('cust1', 3),
-    lambda opcode, pc: map_lscx[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_lsc4[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_fp0[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_fp1[get_op2(opcode)](opcode, pc),
-    emit_reserved3, emit_reserved3, emit_reserved3, emit_reserved3,
-)
-assert len(map_qrst) == 16
+map_qrst = _table('op1', (
+    map_rst0,
+    map_rst1,
+    map_rst2,
+    map_rst3,
+    _op('extui', _extui),
+    _op('extui', _extui),
+    _op('cust0'),
+    _op('cust1'),
+    map_lscx,
+    map_lsc4,
+    map_fp0,
+    map_fp1,
+    _reserved, _reserved, _reserved, _reserved,
+))
 
 # Table 192 - select with op0
-map_op0 = (
-    lambda opcode, pc: map_qrst[get_op1(opcode)](opcode, pc),
-    lambda opcode, pc: ('l32r a%d, 0x%08x' % (get_t(opcode), get_imm16_ri16(opcode) + ((pc + 3) & ~3)), 3),
-    lambda opcode, pc: map_lsai[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: map_lsci[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: map_mac16[get_op2(opcode)](opcode, pc),
-    lambda opcode, pc: map_calln[get_n(opcode)](opcode, pc),
-    lambda opcode, pc: map_si[get_n(opcode)](opcode, pc),
-    lambda opcode, pc: map_b[get_r(opcode)](opcode, pc),
-    lambda opcode, pc: ('l32i.n a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm4u(opcode) << 2), 2),
-    lambda opcode, pc: ('s32i.n a%d, a%d, %d' % (get_t(opcode), get_s(opcode), get_imm4u(opcode) << 2), 2),
-    lambda opcode, pc: ('add.n a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_t(opcode)), 2),
-    lambda opcode, pc: ('addi.n a%d, a%d, a%d' % (get_r(opcode), get_s(opcode), get_imm_addi_n(opcode)), 2),
-    lambda opcode, pc: map_st2[get_t(opcode) >> 2](opcode, pc),
-    lambda opcode, pc: map_st3[get_r(opcode)](opcode, pc),
-    emit_reserved3, emit_reserved3,
-)
-assert len(map_op0) == 16
+map_op0 = _table('op0', (
+    map_qrst,
+    _op('l32r', _l32r),
+    map_lsai,
+    map_lsci,
+    map_mac16,
+    map_calln,
+    map_si,
+    map_b,
+    _op('l32i.n', _at_as_imm4x4, length = 2),
+    _op('s32i.n', _at_as_imm4x4, length = 2),
+    _op('add.n', _ar_as_at, length = 2),
+    _op('addi.n', _addi_n, length = 2),
+    map_st2,
+    map_st3,
+    _reserved, _reserved,
+))
 
 #------------------------------------------------------------------------------
+# Compile the decode tables.
+# The nested tables are flattened into nodes of (shift, mask, entries) where
+# the entries are either nodes or mnemonic ids. Adjacent opcode fields are
+# merged into a single table lookup where the tables allow it.
+
+# mnemonic id -> (name, template, extractor, length)
+mnemonics = []
+_mnemonic_ids = {}
+
+# merged tables are limited to this many selector bits
+_merge_bits_max = 8
+
+def _is_node(x):
+    return isinstance(x, tuple)
+
+def _width(mask):
+    return len(bin(mask)) - 2
+
+def _merge(shift, mask, entries):
+    """merge a table node with its child nodes if they select an adjacent field"""
+    while True:
+        nodes = [x for x in entries if _is_node(x)]
+        if len(nodes) == 0:
+            break
+        (cshift, cmask) = nodes[0][:2]
+        if [x for x in nodes if x[:2] != (cshift, cmask)]:
+            # the child nodes select different fields
+            break
+        (width, cwidth) = (_width(mask), _width(cmask))
+        if width + cwidth > _merge_bits_max:
+            break
+        merged = []
+        if cshift == shift + width:
+            # child field is above the parent field
+            for k in range(1 << (width + cwidth)):
+                x = entries[k & mask]
+                if _is_node(x):
+                    x = x[2][k >> width]
+                merged.append(x)
+        elif cshift + cwidth == shift:
+            # child field is below the parent field
+            shift = cshift
+            for k in range(1 << (width + cwidth)):
+                x = entries[k >> cwidth]
+                if _is_node(x):
+                    x = x[2][k & cmask]
+                merged.append(x)
+        else:
+            # the fields are not adjacent
+            break
+        mask = (1 << (width + cwidth)) - 1
+        entries = tuple(merged)
+    return (shift, mask, entries)
+
+def _compile(x):
+    """compile a decode table (or instruction) to a node (or mnemonic id)"""
+    if len(x) == 3:
+        # instruction
+        if not _mnemonic_ids.has_key(x):
+            (name, (template, extractor), length) = x
+            _mnemonic_ids[x] = len(mnemonics)
+            mnemonics.append((name, template, extractor, length))
+        return _mnemonic_ids[x]
+    # decode table
+    (field, entries) = x
+    (shift, width) = _fields[field]
+    return _merge(shift, (1 << width) - 1, tuple([_compile(e) for e in entries]))
+
+_decode_root = _compile(map_op0)
+
+# data records for the disassemblers
+_data8 = ('0x%02x', lambda opcode, pc: (opcode & 0xff,))
+_data32 = ('0x%08x', lambda opcode, pc: (opcode,))
+
+MNEMONIC_BYTE = _compile(_op('.byte', _data8, length = 1))
+MNEMONIC_WORD = _compile(_op('.word', _data32, length = 4))
+MNEMONIC_RESERVED = _compile(_reserved)
+
+# operand formats with a pc-relative target address as the last operand
+_target_formats = (_call, _target18, _as_target6, _as_target12, _as_at_target8, _as_bit_target8, _as_b4const_target8)
+
+# mnemonic ids for instructions with a target address
+target_ids = frozenset([i for (i, x) in enumerate(mnemonics) if x[1:3] in _target_formats])
+
+#------------------------------------------------------------------------------
+# control flow
+
+FLOW_NONE = 0 # continue with the next instruction
+FLOW_BRANCH = 1 # conditional branch to the target
+FLOW_JUMP = 2 # jump to the target
+FLOW_CALL = 3 # call the target, return to the next instruction
+FLOW_CALLX = 4 # call a register, return to the next instruction
+FLOW_JUMPX = 5 # jump to a register
+FLOW_RETURN = 6 # return from a function/exception
+FLOW_HALT = 7 # illegal instruction or data, no successor
+
+_flow_names = {
+    'j': FLOW_JUMP,
+    'call0': FLOW_CALL, 'call4': FLOW_CALL, 'call8': FLOW_CALL, 'call12': FLOW_CALL,
+    'callx0': FLOW_CALLX, 'callx4': FLOW_CALLX, 'callx8': FLOW_CALLX, 'callx12': FLOW_CALLX,
+    'jx': FLOW_JUMPX,
+    'ret': FLOW_RETURN, 'ret.n': FLOW_RETURN, 'retw': FLOW_RETURN, 'retw.n': FLOW_RETURN,
+    'rfe': FLOW_RETURN, 'rfue': FLOW_RETURN, 'rfde': FLOW_RETURN, 'rfi': FLOW_RETURN,
+    'rfme': FLOW_RETURN, 'rfwo': FLOW_RETURN, 'rfwu': FLOW_RETURN, 'rfdd': FLOW_RETURN,
+    'rfdo': FLOW_RETURN,
+    'ill': FLOW_HALT, 'ill.n': FLOW_HALT, 'reserved': FLOW_HALT,
+    '.byte': FLOW_HALT, '.word': FLOW_HALT,
+}
+
+def _flow(mid):
+    """return the control flow type for a mnemonic id"""
+    name = mnemonics[mid][0]
+    if _flow_names.has_key(name):
+        return _flow_names[name]
+    if mid in target_ids:
+        return FLOW_BRANCH
+    return FLOW_NONE
+
+# control flow type per mnemonic id
+flows = [_flow(i) for i in range(len(mnemonics))]
+
+def da_flow(mid, operands):
+    """return (control flow type, target address or None) for a decoded instruction"""
+    flow = flows[mid]
+    if flow in (FLOW_BRANCH, FLOW_JUMP, FLOW_CALL):
+        return (flow, operands[-1])
+    return (flow, None)
+
+#------------------------------------------------------------------------------
+
+def da_decode(opcode, pc):
+    """decode an opcode, return (mnemonic id, operands, opcode length)"""
+    x = _decode_root
+    while type(x) is tuple:
+        x = x[2][(opcode >> x[0]) & x[1]]
+    (name, template, extractor, length) = mnemonics[x]
+    return (x, extractor(opcode, pc), length)
+
+def da_format(mid, operands):
+    """return the display string for a decoded instruction"""
+    (name, template, extractor, length) = mnemonics[mid]
+    if template:
+        return '%s %s' % (name, template % operands)
+    return name
 
 def da_opcode(opcode, pc):
     """decode an opcode, return the mneumonic and the opcode length"""
-    return map_op0[get_op0(opcode)](opcode, pc)
+    x = _decode_root
+    while type(x) is tuple:
+        x = x[2][(opcode >> x[0]) & x[1]]
+    (name, template, extractor, length) = mnemonics[x]
+    if template:
+        return ('%s %s' % (name, template % extractor(opcode, pc)), length)
+    return (name, length)
 
 #------------------------------------------------------------------------------
 
@@ -981,3 +1154,295 @@ def da_mem(mem, pc):
     return (opcode, opcode_str, opcode_len)
 
 #------------------------------------------------------------------------------
+# Decoded instruction cache.
+# Entries are keyed on (address, raw opcode bytes), so a hit is only possible for
+# unchanged code. Regions written through the debugger can be dropped wholesale.
+
+class decode_cache(object):
+
+    def __init__(self, size = 4096):
+        self.size = size
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, opcode, pc):
+        """return (mnemonic id, operands, length) for an opcode at pc"""
+        key = (pc, opcode)
+        x = self.cache.pop(key, None)
+        if x is None:
+            self.misses += 1
+            x = da_decode(opcode, pc)
+            if len(self.cache) >= self.size:
+                # evict the least recently used entry
+                self.cache.popitem(last = False)
+        else:
+            self.hits += 1
+        self.cache[key] = x
+        return x
+
+    def invalidate(self, adr, size):
+        """drop entries for instructions overlapping [adr, adr + size)"""
+        # instructions are at most 3 bytes long
+        stale = [k for k in self.cache if k[0] < adr + size and k[0] + 3 > adr]
+        for k in stale:
+            del self.cache[k]
+
+    def clear(self):
+        """drop all entries"""
+        self.cache.clear()
+
+    def __str__(self):
+        return '%d/%d entries, %d hits, %d misses' % (len(self.cache), self.size, self.hits, self.misses)
+
+#------------------------------------------------------------------------------
+# Linear sweep disassembly.
+# Data (explicit islands, reserved encodings and truncated instructions at the
+# end of the buffer) is emitted as .word/.byte records.
+
+def disassemble(buf, base, start = None, end = None, islands = (), cache = None):
+    """
+    linear sweep disassembly of a buffer
+    buf: byte string, bytearray or buffer
+    base: address of buf[0]
+    start, end: disassemble instructions starting in [start, end)
+    (defaults to the whole buffer, instructions may extend beyond end)
+    islands: sorted [start, end) address ranges of data
+    cache: optional decode_cache
+    yields (adr, opcode, mnemonic id, operands, length)
+    """
+    decode = da_decode
+    if cache is not None:
+        decode = cache.decode
+    mem = bytearray(buf)
+    n = len(mem)
+    adr = (start, base)[start is None]
+    end = (end, base + n)[end is None]
+    islands = [x for x in islands if x[1] > adr]
+    island = (islands or [(base + n, base + n)])[0]
+    while adr < end:
+        i = adr - base
+        k = n - i
+        if k <= 0:
+            break
+        if adr >= island[1]:
+            # move to the next island
+            islands.pop(0)
+            island = (islands or [(base + n, base + n)])[0]
+            continue
+        if adr >= island[0]:
+            # data island
+            if (adr & 3) == 0 and k >= 4 and adr + 4 <= island[1]:
+                opcode = mem[i] | (mem[i + 1] << 8) | (mem[i + 2] << 16) | (mem[i + 3] << 24)
+                yield (adr, opcode, MNEMONIC_WORD, (opcode,), 4)
+                adr += 4
+            else:
+                yield (adr, mem[i], MNEMONIC_BYTE, (mem[i],), 1)
+                adr += 1
+            continue
+        # instruction
+        if k >= 3:
+            opcode = mem[i] | (mem[i + 1] << 8) | (mem[i + 2] << 16)
+        elif k == 2:
+            opcode = mem[i] | (mem[i + 1] << 8)
+        else:
+            opcode = mem[i]
+        (mid, operands, length) = decode(opcode, adr)
+        if mid == MNEMONIC_RESERVED or length > k or adr + length > island[0]:
+            # not an instruction
+            yield (adr, mem[i], MNEMONIC_BYTE, (mem[i],), 1)
+            adr += 1
+            continue
+        yield (adr, opcode & ((1 << (length * 8)) - 1), mid, operands, length)
+        adr += length
+
+def disassemble_blocks(blocks, base, islands = (), cache = None):
+    """
+    linear sweep disassembly of consecutive memory blocks
+    blocks: iterable of byte strings, the first is at address base
+    islands: sorted [start, end) address ranges of data
+    cache: optional decode_cache
+    yields (adr, opcode, mnemonic id, operands, length)
+    """
+    carry = bytearray()
+    adr = base
+    for block in blocks:
+        data = carry + bytearray(block)
+        # Records are at most 4 bytes. Stop short of the end of the block
+        # and carry the remainder over to the next block.
+        nxt = adr
+        for x in disassemble(data, adr, adr, adr + len(data) - 3, islands, cache):
+            yield x
+            nxt = x[0] + x[4]
+        carry = data[nxt - adr:]
+        adr = nxt
+    for x in disassemble(carry, adr, islands = islands, cache = cache):
+        yield x
+
+#------------------------------------------------------------------------------
+# Parallel linear sweep disassembly.
+# The buffer is split into chunks that are swept independently by a pool of
+# worker processes. A chunk sweep starts at the chunk boundary, which may be
+# inside an instruction. The parent re-sweeps from the end of the previous
+# chunk until it lands on an address the worker also decoded (a linear sweep
+# resynchronises after a few instructions), so the merged result is the same
+# as a single sweep of the whole buffer.
+
+# 32-bit unsigned array typecode
+_u32 = ('L', 'I')[array.array('I').itemsize == 4]
+
+# chunk size for parallel disassembly
+_chunk_size = 64 << 10
+
+# bytes beyond a chunk needed to decode a record starting in the chunk
+_chunk_lookahead = 3
+
+_opcode_fmt = ('%02x', '%04x', '%06x', '%08x')
+
+def da_line(adr, opcode, mid, operands, length):
+    """return the listing line (with newline) for a disassembly record"""
+    return '%08x: %-8s %s\n' % (adr, _opcode_fmt[length - 1] % opcode, da_format(mid, operands))
+
+def _sweep_chunk(args):
+    """
+    worker: disassemble and format a chunk
+    return (start, stop, end, addresses, line offsets, listing text)
+    The addresses and offsets are array byte strings, so they are cheap to pass back.
+    """
+    (data, start, stop, islands) = args
+    adrs = array.array(_u32)
+    offsets = array.array(_u32)
+    lines = []
+    n = 0
+    end = start
+    for x in disassemble(data, start, start, stop, islands):
+        s = da_line(*x)
+        adrs.append(x[0])
+        offsets.append(n)
+        lines.append(s)
+        n += len(s)
+        end = x[0] + x[4]
+    return (start, stop, end, adrs.tostring(), offsets.tostring(), ''.join(lines))
+
+def _chunks(buf, base, islands, chunk_size):
+    """generate the worker arguments for each chunk of buf"""
+    n = len(buf)
+    for i in xrange(0, n, chunk_size):
+        k = min(chunk_size, n - i)
+        yield (buf[i:i + k + _chunk_lookahead], base + i, base + i + k, islands)
+
+def disassemble_parallel(buf, base, islands = (), chunk_size = _chunk_size, processes = None):
+    """
+    linear sweep disassembly listing of a large buffer using a process pool
+    buf: byte string
+    base: address of buf[0]
+    islands: sorted [start, end) address ranges of data
+    processes: number of worker processes (defaults to the cpu count)
+    yields the listing text (see da_line) in address order, a chunk at a time
+    The workers decode and format, the parent only resyncs the chunk boundaries.
+    """
+    buf = str(buf)
+    islands = tuple(islands)
+    if len(buf) <= chunk_size:
+        yield ''.join([da_line(*x) for x in disassemble(buf, base, islands = islands)])
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        adr = base
+        for (start, stop, end, adrs, offsets, text) in pool.imap(_sweep_chunk, _chunks(buf, base, islands, chunk_size)):
+            if adr != start:
+                # the previous chunk ended inside this one: sweep until we are in sync
+                adrs = array.array(_u32, adrs)
+                lines = []
+                while adr < stop:
+                    k = bisect.bisect_left(adrs, adr)
+                    if k < len(adrs) and adrs[k] == adr:
+                        break
+                    i = adr - base
+                    x = next(disassemble(buf[i:i + 4 + _chunk_lookahead], adr, adr, adr + 1, islands))
+                    lines.append(da_line(*x))
+                    adr += x[4]
+                yield ''.join(lines)
+                if adr >= stop:
+                    continue
+                text = text[array.array(_u32, offsets)[k]:]
+            yield text
+            adr = end
+    finally:
+        pool.terminate()
+        pool.join()
+
+#------------------------------------------------------------------------------
+# Compact instruction listings.
+# Disassembly records are stored as a struct of arrays (about 11 bytes per
+# instruction). Operands are re-extracted from the opcode and formatting is
+# done on demand.
+
+class insn(object):
+    """a decoded instruction"""
+
+    __slots__ = ('adr', 'opcode', 'mid', 'length')
+
+    def __init__(self, adr, opcode, mid, length):
+        self.adr = adr
+        self.opcode = opcode
+        self.mid = mid
+        self.length = length
+
+    def name(self):
+        return mnemonics[self.mid][0]
+
+    def operands(self):
+        return mnemonics[self.mid][2](self.opcode, self.adr)
+
+    def flow(self):
+        """return (control flow type, target address or None)"""
+        return da_flow(self.mid, self.operands())
+
+    def __str__(self):
+        return da_line(self.adr, self.opcode, self.mid, self.operands(), self.length)[:-1]
+
+class listing(object):
+    """an address ordered list of decoded instructions"""
+
+    def __init__(self, records = ()):
+        """records: (adr, opcode, mnemonic id, operands, length) from a disassembler"""
+        self.adr = array.array(_u32)
+        self.opcode = array.array(_u32)
+        self.mid = array.array('H')
+        self.length = array.array('B')
+        self.extend(records)
+
+    def append(self, x):
+        (adr, opcode, mid, operands, length) = x
+        self.adr.append(adr)
+        self.opcode.append(opcode)
+        self.mid.append(mid)
+        self.length.append(length)
+
+    def extend(self, records):
+        for x in records:
+            self.append(x)
+
+    def __len__(self):
+        return len(self.adr)
+
+    def __getitem__(self, i):
+        return insn(self.adr[i], self.opcode[i], self.mid[i], self.length[i])
+
+    def __iter__(self):
+        for i in xrange(len(self.adr)):
+            yield insn(self.adr[i], self.opcode[i], self.mid[i], self.length[i])
+
+    def find(self, adr):
+        """return the index of the instruction containing adr - or None"""
+        i = bisect.bisect_right(self.adr, adr) - 1
+        if i < 0 or adr >= self.adr[i] + self.length[i]:
+            return None
+        return i
+
+    def nbytes(self):
+        """return the memory used by the arrays"""
+        return sum([len(x) * x.itemsize for x in (self.adr, self.opcode, self.mid, self.length)])
+
+#------------------------------------------------------------------------------
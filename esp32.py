@@ -4,12 +4,14 @@ ESP32 Specific Interface
 """
 #------------------------------------------------------------------------------
 
+import os
 import time
 
 import jtag
 import mini108
 import lib
 import soc
+import svd
 
 #------------------------------------------------------------------------------
 
@@ -201,6 +203,11 @@ _TIMG_regset = (
   ('clk', 32, 0xfc, None, ''),
 )
 
+# Optional register database: a CMSIS-SVD file (e.g. the vendor esp32.svd)
+# or a JSON file with the same tables (see svd.py). Peripherals without
+# hand-coded register sets take their registers from it.
+_svd_names = ('svd/esp32.svd', 'svd/esp32.json')
+
 def make_soc():
   s = soc.soc()
   s.soc_name = 'esp32'
@@ -274,6 +281,11 @@ def make_soc():
   # external SRAM
   s.insert(soc.make_peripheral('eram', 0x3F800000, 4 << 20, None, 'external ram'))
 
+  for name in _svd_names:
+    if os.path.isfile(name):
+      s.merge(svd.load(name))
+      break
+
   return s
 
 #------------------------------------------------------------------------------
@@ -313,6 +325,20 @@ class xtensa(object):
     """restore a set of scratch registers"""
     self.ocd[self.core].execute(lib.restore_regs, idata = regs)
 
+  def is_blank(self, adr, n):
+    """return True if n bytes at adr (64 byte aligned) are all 0xff - checked on the target"""
+    adr &= ~63
+    regs = self.save_regs()
+    blank = True
+    for ofs in xrange(0, n, 64):
+      val = []
+      self.ocd[self.core].execute(lib.and32_x16, idata = (adr + ofs,), odata = val)
+      if val[0] != 0xffffffff:
+        blank = False
+        break
+    self.restore_regs(regs)
+    return blank
+
   def rd(self, adr, n):
     """read from memory - n bits aligned"""
     adr &= ~((n >> 3) - 1)
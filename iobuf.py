@@ -5,7 +5,10 @@ Stateful objects used to produce/consume data from JTAG devices
 """
 # ----------------------------------------------------------------------------
 
+import os
 import sys
+import mmap
+import array
 import string
 import struct
 import hashlib
@@ -17,6 +20,16 @@ import util
 
 printable = string.letters + string.digits + string.punctuation + ' '
 
+# array typecodes for 8, 16 and 32 bit values
+_typecodes = {8: 'B', 16: 'H', 32: ('L', 'I')[array.array('I').itemsize == 4]}
+
+# 8-bit value to ascii character (non-printables are '.')
+_ascii_map = ''.join([('.', chr(i))[chr(i) in printable] for i in range(256)])
+
+def host_swap(mode):
+  """return True if values in mode byte order need swapping on this host"""
+  return (mode == 'be') != (sys.byteorder == 'big')
+
 #-----------------------------------------------------------------------------
 
 class write_file(object):
@@ -51,16 +64,64 @@ class write_file(object):
     self.n += 1
     self.progress.update(self.n)
 
+  def wr_bytes(self, s):
+    """write a byte string"""
+    self.f.write(s)
+    self.n += len(s)
+    self.progress.update(self.n)
+
+#-----------------------------------------------------------------------------
+
+class file_source(object):
+  """
+  read-only, memory mapped view of a file as 8/16/32-bit words
+  Reads beyond EOF return 0xff bytes. Only the slice that crosses EOF is
+  copied and padded, everything else is a zero-copy view of the mapping.
+  """
+
+  def __init__(self, name, mode = 'le'):
+    self.f = open(name, 'rb')
+    self.size = os.fstat(self.f.fileno()).st_size
+    self.mm = None
+    if self.size:
+      self.mm = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+    self.swap = host_swap(mode)
+
+  def close(self):
+    if self.mm is not None:
+      self.mm.close()
+    self.f.close()
+
+  def view(self, ofs, n):
+    """return n bytes at file offset ofs"""
+    k = min(max(self.size - ofs, 0), n)
+    if k == 0:
+      # empty file or beyond EOF
+      return '\xff' * n
+    if k == n:
+      return buffer(self.mm, ofs, n)
+    # pad the tail of the file
+    return ''.join([self.mm[ofs:ofs + k], '\xff' * (n - k)])
+
+  def words(self, width, ofs, n):
+    """return an array of n width-bit words at file offset ofs"""
+    x = array.array(_typecodes[width])
+    x.fromstring(self.view(ofs, n * (width >> 3)))
+    if self.swap and width != 8:
+      x.byteswap()
+    return x
+
 #-----------------------------------------------------------------------------
 
 class read_file(object):
 
-  def __init__(self, ui, msg, name, size, mode = 'le'):
+  def __init__(self, ui, msg, name, size, mode = 'le', block_size = 4 << 10):
     self.ui = ui
-    self.f = open(name, 'rb')
+    self.src = file_source(name, mode)
     self.n = 0
-    self.fmt16 = ('>H', '<H')[mode == 'le']
-    self.fmt32 = ('>L', '<L')[mode == 'le']
+    self.block_size = block_size
+    # prefetched words: (width, file offset of block, words)
+    self.block = (None, 0, ())
     # display output
     self.t_start = time.time()
     self.ui.put('%s ' % msg)
@@ -68,7 +129,7 @@ class read_file(object):
 
   def close(self, rate = False):
     t_end = time.time()
-    self.f.close()
+    self.src.close()
     self.progress.erase()
     if rate:
       s = '%.2f KiB/sec' % (float(self.n)/((t_end - self.t_start) * 1024.0))
@@ -76,69 +137,116 @@ class read_file(object):
     else:
       self.ui.put('done\n')
 
-  def rd32(self):
-    val = self.f.read(4)
-    n = len(val)
-    if n != 4:
-      val = ''.join([val, '\xff' * (4 - n)])
-    self.n += 4
+  def rd_buffer(self, width, n):
+    """read n width-bit words as a data_buffer (for block transfers)"""
+    io = data_buffer(width)
+    io.buf = self.src.words(width, self.n, n)
+    io.wr_idx = n
+    self.n += n * (width >> 3)
+    self.progress.update(self.n)
+    return io
+
+  def rd(self, width):
+    """read a width-bit word"""
+    (w, ofs, words) = self.block
+    i = (self.n - ofs) / (width >> 3)
+    if w != width or i < 0 or i >= len(words):
+      # prefetch the next block of words
+      ofs = self.n
+      words = self.src.words(width, ofs, self.block_size / (width >> 3))
+      self.block = (width, ofs, words)
+      i = 0
+    self.n += width >> 3
     self.progress.update(self.n)
-    return struct.unpack(self.fmt32, val)[0]
+    return words[i]
+
+  def rd32(self):
+    return self.rd(32)
 
   def rd16(self):
-    val = self.f.read(2)
-    n = len(val)
-    if n != 2:
-      val = ''.join([val, '\xff' * (2 - n)])
-    self.n += 2
-    self.progress.update(self.n)
-    return struct.unpack(self.fmt16, val)[0]
+    return self.rd(16)
 
   def rd8(self):
-    val = self.f.read(1)
-    n = len(val)
-    if n == 0:
-      val = '\xff'
-    self.n += 1
-    self.progress.update(self.n)
-    return struct.unpack('B', val)[0]
+    return self.rd(8)
 
 #-----------------------------------------------------------------------------
 
 class verify_file(object):
-
-  def __init__(self, ui, msg, name, size, mode = 'le'):
+  """
+  verify target memory against a file
+  The target words are compared against the file a block at a time. Only blocks
+  that differ are examined word by word, and the mismatches are recorded as
+  ranges of adjacent differing words.
+  """
+
+  def __init__(self, ui, msg, name, size, mode = 'le', adr = 0, block_size = 4 << 10):
     self.ui = ui
-    self.f = open(name, 'rb')
+    self.src = file_source(name, mode)
     self.n = 0
-    self.diff = []
-    self.fmt16 = ('>H', '<H')[mode == 'le']
-    self.fmt32 = ('>L', '<L')[mode == 'le']
+    self.adr = adr
+    self.block_size = block_size
+    self.block = array.array(_typecodes[32])
+    # mismatches: [first_adr, last_adr, count] for runs of adjacent words
+    self.ranges = []
+    self.ndiff = 0
     # display output
     self.ui.put('%s ' % msg)
     self.progress = util.progress(ui, 8, size)
 
   def close(self):
-    self.f.close()
+    self.verify_block()
+    self.src.close()
     self.progress.erase()
-    if len(self.diff) == 0:
+    if self.ndiff == 0:
       self.ui.put('same\n')
     else:
-      self.ui.put('%d differences\n' % len(self.diff))
-
-  def file_rd32(self):
-    val = self.f.read(4)
-    n = len(val)
-    if n != 4:
-      val = ''.join([val, '\xff' * (4 - n)])
-    return struct.unpack(self.fmt32, val)[0]
+      self.ui.put('%d differences\n' % self.ndiff)
+      clist = []
+      for (start, end, count) in self.ranges:
+        clist.append(['%08x %08x' % (start, end + 3), ': %d words' % count])
+      self.ui.put('%s\n' % util.display_cols(clist))
+
+  def verify_block(self):
+    """compare the current block of target words against the file"""
+    mem = self.block
+    n = len(mem)
+    if n == 0:
+      return
+    ofs = self.n - (n * 4)
+    x = self.src.words(32, ofs, n)
+    self.block = array.array(_typecodes[32])
+    if mem == x:
+      # the whole block is the same
+      return
+    # find the differing words
+    block_adr = self.adr + ofs
+    for i in xrange(n):
+      if mem[i] == x[i]:
+        continue
+      self.ndiff += 1
+      adr = block_adr + (i * 4)
+      if self.ranges and self.ranges[-1][1] == adr - 4:
+        # extend a run of adjacent differing words (possibly from the previous block)
+        r = self.ranges[-1]
+        r[1] = adr
+        r[2] += 1
+      else:
+        self.ranges.append([adr, adr, 1])
 
   def wr32(self, val):
-    x = self.file_rd32()
-    if val != x:
-      self.diff.append((self.n, val, x))
+    self.block.append(val)
     self.n += 4
     self.progress.update(self.n)
+    if len(self.block) * 4 == self.block_size:
+      self.verify_block()
+
+  def wr_buffer(self, io):
+    """verify a data_buffer of 32-bit target words (from a block transfer)"""
+    self.verify_block()
+    self.block = array.array(_typecodes[32], io.buf)
+    self.n += len(io.buf) * 4
+    self.progress.update(self.n)
+    self.verify_block()
 
 #-----------------------------------------------------------------------------
 
@@ -146,10 +254,13 @@ class data_buffer(object):
 
   def __init__(self, width, data = None):
     self.width = width
-    self.buf = []
+    self.mask = util.mask(self.width)
+    self.buf = array.array(_typecodes[self.width])
     if data:
-      mask = util.mask(self.width)
-      self.buf = [x & mask for x in data]
+      if isinstance(data, array.array) and data.typecode == self.buf.typecode:
+        self.buf.extend(data)
+      else:
+        self.buf.extend([x & self.mask for x in data])
     self.wr_idx = len(self.buf)
     self.rd_idx = 0
 
@@ -165,7 +276,7 @@ class data_buffer(object):
 
   def write(self, val):
     """write to the data buffer"""
-    val = util.mask_val(val, self.width)
+    val &= self.mask
     if self.wr_idx == len(self.buf):
       # append to the buffer
       self.buf.append(val)
@@ -200,168 +311,72 @@ class data_buffer(object):
     assert self.width == 8
     self.write(val)
 
-  def convert8(self, mode):
-    """convert the buffer to 8 bit values"""
-    if self.width == 32:
-      new_buf = []
-      for x in self.buf:
-        if mode == 'be':
-          # big endian conversion
-          new_buf.append((x >> 24) & 255)
-          new_buf.append((x >> 16) & 255)
-          new_buf.append((x >> 8) & 255)
-          new_buf.append(x & 255)
-        else:
-          # little endian conversion
-          new_buf.append(x & 255)
-          new_buf.append((x >> 8) & 255)
-          new_buf.append((x >> 16) & 255)
-          new_buf.append((x >> 24) & 255)
-      self.buf = new_buf
-    elif self.width == 16:
-      new_buf = []
-      for x in self.buf:
-        if mode == 'be':
-          # big endian conversion
-          new_buf.append((x >> 8) & 255)
-          new_buf.append(x & 255)
-        else:
-          # little endian conversion
-          new_buf.append(x & 255)
-          new_buf.append((x >> 8) & 255)
-      self.buf = new_buf
-    elif self.width == 8:
+  def to_bytes(self, mode):
+    """return the buffer as a byte string with mode ('le'/'be') byte order"""
+    if self.width != 8 and host_swap(mode):
+      x = array.array(self.buf.typecode, self.buf)
+      x.byteswap()
+      return x.tostring()
+    return self.buf.tostring()
+
+  def convert(self, width, mode):
+    """convert the buffer to width bit values"""
+    if width == self.width:
       # nothing to do
       return
-    else:
-      assert False, 'conversion error: width %d' % self.width
+    assert width in _typecodes, 'conversion error: width %d' % width
+    # reinterpret the bytes, rounding up to a multiple of the new width
+    s = self.to_bytes(mode)
+    n = len(s) % (width >> 3)
+    if n:
+      s = ''.join([s, '\x00' * ((width >> 3) - n)])
+    self.buf = array.array(_typecodes[width])
+    self.buf.fromstring(s)
+    if width != 8 and host_swap(mode):
+      self.buf.byteswap()
     # reset the buffer indices
     self.wr_idx = len(self.buf)
     self.rd_idx = 0
-    self.width = 8
+    self.width = width
+    self.mask = util.mask(width)
+
+  def convert8(self, mode):
+    """convert the buffer to 8 bit values"""
+    self.convert(8, mode)
 
   def convert16(self, mode):
     """convert the buffer to 16 bit values"""
-    if self.width == 32:
-      new_buf = []
-      for x in self.buf:
-        if mode == 'be':
-          # big endian conversion
-          new_buf.append((x >> 16) & 0xffff)
-          new_buf.append(x & 0xffff)
-        else:
-          # little endian conversion
-          new_buf.append(x & 0xffff)
-          new_buf.append((x >> 16) & 0xffff)
-      self.buf = new_buf
-    elif self.width == 16:
-      # nothing to do
-      return
-    elif self.width == 8:
-      # round up to a multiple of 2 bytes
-      n = len(self.buf) & 1
-      self.buf.extend((0,) * n)
-      new_buf = []
-      for i in range(0, len(self.buf), 2):
-        if mode == 'be':
-          # big endian conversion
-          val = (self.buf[i] << 8) | self.buf[i+1]
-        else:
-          # little endian conversion
-          val = self.buf[i] | (self.buf[i+1] << 8)
-        new_buf.append(val)
-      self.buf = new_buf
-    else:
-      assert False, 'conversion error: width %d' % self.width
-    # reset the buffer indices
-    self.wr_idx = len(self.buf)
-    self.rd_idx = 0
-    self.width = 16
+    self.convert(16, mode)
 
   def convert32(self, mode):
     """convert the buffer to 32 bit values"""
-    if self.width == 32:
-      # nothing to do
-      return
-    elif self.width == 16:
-      assert False, 'TODO: unsupported conversion from 16 to 32 bits'
-    elif self.width == 8:
-      # round up to a multiple of 4 bytes
-      n = (4 - (len(self.buf) & 3)) & 3
-      self.buf.extend((0,) * n)
-      new_buf = []
-      for i in range(0, len(self.buf), 4):
-        if mode == 'be':
-          # big endian conversion
-          val = ((self.buf[i] << 24) |
-                 (self.buf[i+1] << 16) |
-                 (self.buf[i+2] << 8) |
-                 (self.buf[i+3]))
-        else:
-          # little endian conversion
-          val = (self.buf[i] |
-                 (self.buf[i+1] << 8) |
-                 (self.buf[i+2] << 16) |
-                 (self.buf[i+3] << 24))
-        new_buf.append(val)
-      self.buf = new_buf
-    else:
-      assert False, 'conversion error: width %d' % self.width
-    # reset the buffer indices
-    self.wr_idx = len(self.buf)
-    self.rd_idx = 0
-    self.width = 32
-
-  def convert(self, width, mode):
-    if width == 8:
-      self.convert8(mode)
-    elif width == 16:
-      self.convert16(mode)
-    elif width == 32:
-      self.convert32(mode)
-    else:
-      assert False, 'bad width'
+    self.convert(32, mode)
 
   def endian_swap(self):
     """swap the endian-ness of all values"""
-    if self.width == 32:
-      self.buf = [util.swap32(x) for x in self.buf]
-    elif self.width == 16:
-      self.buf = [util.swap16(x) for x in self.buf]
-    elif self.width == 8:
-      # nothing to do
-      return
-    else:
-      assert False, 'endian swap error: width %d' % self.width
+    self.buf.byteswap()
 
   def compare(self, x):
     """compare io buffers: return True if they are the same"""
     if self.width != x.width:
       return False
-    if len(self.buf) != len(x.buf):
-      return False
-    for i in xrange(len(self.buf)):
-      if self.buf[i] != x.buf[i]:
-        return False
-    return True
+    return self.buf == x.buf
 
   def md5(self, mode):
     """return an md5 hash of the buffer"""
-    x = self.copy()
-    x.convert8(mode)
     m = hashlib.md5()
-    m.update(''.join([chr(b) for b in x.buf]))
+    m.update(self.to_bytes(mode))
     return m.hexdigest()
 
   def ascii_str(self):
     """return an ascii string representing an 8-bit buffer"""
     assert self.width == 8, 'width must be 8 bits'
-    return ''.join([('.', chr(b))[chr(b) in printable] for b in self.buf])
+    return self.buf.tostring().translate(_ascii_map)
 
   def to_str(self):
     """convert an 8-bit buffer to a string"""
     assert self.width == 8, 'width must be 8 bits'
-    return ''.join([chr(b) for b in self.buf])
+    return self.buf.tostring()
 
   def __len__(self):
     return len(self.buf)
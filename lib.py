@@ -1,3 +1,40 @@
+and32_x16 = {
+  'code': (
+    0x036800,
+    0x002012,
+    0x012022,
+    0x101120,
+    0x022022,
+    0x101120,
+    0x032022,
+    0x101120,
+    0x042022,
+    0x101120,
+    0x052022,
+    0x101120,
+    0x062022,
+    0x101120,
+    0x072022,
+    0x101120,
+    0x082022,
+    0x101120,
+    0x092022,
+    0x101120,
+    0x0a2022,
+    0x101120,
+    0x0b2022,
+    0x101120,
+    0x0c2022,
+    0x101120,
+    0x0d2022,
+    0x101120,
+    0x0e2022,
+    0x101120,
+    0x0f2022,
+    0x101120,
+    0x136810,
+  ),
+}
 rd16 = {
   'code': (
     0x036800,
@@ -82,12 +119,14 @@ restore_regs = {
   'code': (
     0x036800,
     0x036810,
+    0x036820,
   ),
 }
 save_regs = {
   'code': (
     0x136800,
     0x136810,
+    0x136820,
   ),
 }
 wr16 = {
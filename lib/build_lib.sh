@@ -5,6 +5,7 @@ LIB=../lib.py
 
 rm $LIB
 
+$ASM2PY and32_x16.S >> $LIB
 $ASM2PY rd16.S >> $LIB
 $ASM2PY rd32.S >> $LIB
 $ASM2PY rd32_x16.S >> $LIB
@@ -85,6 +85,10 @@ def would_block(fd, timeout):
   (rd, _, _) = select.select((fd,), (), (), timeout)
   return len(rd) == 0
 
+def poll(timeout):
+  """if a key is pressed within timeout seconds - consume it and return True"""
+  return _getc(_STDIN, timeout) != _KEY_NULL
+
 # -----------------------------------------------------------------------------
 
 # Use this value if we can't work out how many columns the terminal has.
@@ -500,6 +504,31 @@ class linenoise(object):
     self.rawmode = True
     return 0
 
+  def enable_cbreak(self, fd):
+    """Enable single key input (no line buffering or echo, output unchanged)"""
+    if not os.isatty(fd):
+      return -1
+    if not self.atexit_flag:
+      atexit.register(self.atexit)
+      self.atexit_flag = True
+    self.orig_termios = termios.tcgetattr(fd)
+    cbreak = termios.tcgetattr(fd)
+    # local modes - echo off, canonical off
+    cbreak[_C_LFLAG] &= ~(termios.ECHO | termios.ICANON)
+    cbreak[_C_CC][termios.VMIN] = 1
+    cbreak[_C_CC][termios.VTIME] = 0
+    termios.tcsetattr(fd, termios.TCSAFLUSH, cbreak)
+    self.rawmode = True
+    return 0
+
+  def poll_begin(self):
+    """Start polling stdin for key presses (see poll())"""
+    return self.enable_cbreak(_STDIN)
+
+  def poll_end(self):
+    """Stop polling stdin for key presses"""
+    self.disable_rawmode(_STDIN)
+
   def disable_rawmode(self, fd):
     """Disable raw mode"""
     if self.rawmode:
@@ -9,6 +9,7 @@ import util
 import iobuf
 import time
 import random
+import da
 
 # -----------------------------------------------------------------------------
 
@@ -20,6 +21,22 @@ _help_mem_2file = (
   ('  len', 'length of memory region (hex)'),
 )
 
+_help_mem_2sparse = (
+  ('<filename> <address/name> [len]', 'read from flash, list blank sectors, write to file'),
+  ('  filename', 'name of file - blank sectors are listed in <filename>.blank'),
+  ('  address', 'address of memory (hex)'),
+  ('  name', 'name of memory region - see "map" command'),
+  ('  len', 'length of memory region (hex)'),
+)
+
+_help_mem_file2 = (
+  ('<filename> <address/name> [len]', 'read from file, write to memory'),
+  ('  filename', 'name of file'),
+  ('  address', 'address of memory (hex)'),
+  ('  name', 'name of memory region - see "map" command'),
+  ('  len', 'length of memory region (hex) - defaults to filesize'),
+)
+
 _help_mem_verify = (
   ('<filename> <address/name> [len]', 'read from file, verify against memory'),
   ('  filename', 'name of file'),
@@ -46,6 +63,26 @@ _help_mem_wr = (
 
 # -----------------------------------------------------------------------------
 
+# large memory regions are read in blocks of this size
+_rd_block_size = 64 << 10
+
+_pic_symbols = {'\x00': '-', '\xff': '.'}
+
+def pic_symbol(s):
+  """return a character to represent the bytes in s"""
+  if len(s) == 0:
+    # beyond the end of the region
+    return ' '
+  c = s[0]
+  if s.count(c) != len(s):
+    return '$'
+  return _pic_symbols.get(c, '$')
+
+# flash sectors are checked for blank (erased) state at this granularity
+_flash_sector_size = 4 << 10
+
+# -----------------------------------------------------------------------------
+
 class region(object):
   """class to represent a memory region"""
 
@@ -101,12 +138,19 @@ class mem(object):
 
   def __init__(self, cpu):
     self.cpu = cpu
+    # decoded instructions for the disassembler
+    self.da_cache = da.decode_cache()
+    # read-only regions served from host images: (adr, size, iobuf.file_source)
+    self.shadows = []
 
     self.menu = (
       ('d8', self.cmd_display8, _help_mem_region),
       ('d16', self.cmd_display16, _help_mem_region),
       ('d32', self.cmd_display32, _help_mem_region),
+      ('da', self.cmd_disassemble, _help_mem_region),
       ('>file', self.cmd_mem2file, _help_mem_2file),
+      ('<file', self.cmd_file2mem, _help_mem_file2),
+      ('>sparse', self.cmd_mem2sparse, _help_mem_2sparse),
       ('md5', self.cmd_md5, _help_mem_region),
       ('pic', self.cmd_pic, _help_mem_region),
       ('rd8', self.cmd_rd8, _help_mem_rd),
@@ -121,6 +165,48 @@ class mem(object):
       ('wr32', self.cmd_wr32, _help_mem_wr),
     )
 
+  def add_shadow(self, adr, size, src):
+    """serve reads of an immutable region from a host image"""
+    self.shadows.append((adr, size, src))
+
+  def rm_shadows(self):
+    """read all memory from the target"""
+    for (adr, size, src) in self.shadows:
+      src.close()
+    self.shadows = []
+
+  def shadow(self, adr, n):
+    """return (source, offset) if [adr, adr + n) is shadowed - or None"""
+    for (base, size, src) in self.shadows:
+      if base <= adr and adr + n <= base + size:
+        return (src, adr - base)
+    return None
+
+  def rdmem32(self, adr, n, io):
+    """read n 32-bit words at adr into io"""
+    x = self.shadow(adr, n * 4)
+    if x is None:
+      self.cpu.rdmem32(adr, n, io)
+      return
+    (src, ofs) = x
+    for val in src.words(32, ofs, n):
+      io.wr32(val)
+
+  def rd_blocks(self, adr, n, block_size = _rd_block_size, shadow = True):
+    """read n bytes of memory at adr (32-bit aligned), yield byte strings of up to block_size"""
+    while n > 0:
+      k = min(block_size, n)
+      x = (None, self.shadow(adr, k))[shadow]
+      if x is None:
+        io = iobuf.data_buffer(32)
+        self.cpu.rdmem32(adr, k / 4, io)
+        yield io.to_bytes('le')
+      else:
+        (src, ofs) = x
+        yield str(src.view(ofs, k))
+      adr += k
+      n -= k
+
   def cmd_rd(self, ui, args, n):
     """memory read command for n bits"""
     if util.wrong_argc(ui, args, (1,)):
@@ -129,8 +215,14 @@ class mem(object):
     if adr == None:
       return
     adr = util.align(adr, n)
+    x = self.shadow(adr, n / 8)
+    if x is None:
+      val = self.cpu.rd(adr, n)
+    else:
+      (src, ofs) = x
+      val = src.words(n, ofs, 1)[0]
     ui.put('[0x%08x] = ' % adr)
-    ui.put('0x%%0%dx\n' % (n/4) % self.cpu.rd(adr, n))
+    ui.put('0x%%0%dx\n' % (n/4) % val)
 
   def cmd_rd8(self, ui, args):
     """read 8 bits"""
@@ -159,6 +251,7 @@ class mem(object):
         return
     val = util.mask_val(val, n)
     self.cpu.wr(adr, val, n)
+    self.da_cache.invalidate(adr, n / 8)
     ui.put('[0x%08x] = ' % adr)
     ui.put('0x%%0%dx\n' % (n/4) % val)
 
@@ -188,8 +281,52 @@ class mem(object):
     n = util.nbytes_to_nwords(size, 32)
     # read memory, write to file object
     mf = iobuf.write_file(ui, 'writing to %s' % name, name, n * 4)
-    self.cpu.rdmem32(adr, n, mf)
+    self.rdmem32(adr, n, mf)
+    mf.close()
+
+  def cmd_mem2sparse(self, ui, args):
+    """read from flash, list blank sectors, write to file"""
+    x = util.file_mem_args(ui, args, self.cpu.device)
+    if x is None:
+      return
+    (name, adr, size) = x
+    if size is None:
+      ui.put('invalid length')
+      return
+    # adjust the address and length to whole sectors
+    adr &= ~(_flash_sector_size - 1)
+    nsectors = (size + _flash_sector_size - 1) / _flash_sector_size
+    # blank sectors checked on the target are not transferred
+    is_blank = getattr(self.cpu, 'is_blank', None)
+    n = _flash_sector_size / 4
+    erased = '\xff' * _flash_sector_size
+    ranges = []
+    nskipped = 0
+    mf = iobuf.write_file(ui, 'writing to %s' % name, name, nsectors * _flash_sector_size)
+    for i in xrange(nsectors):
+      sector_adr = adr + (i * _flash_sector_size)
+      if is_blank is not None and is_blank(sector_adr, _flash_sector_size):
+        data = erased
+        nskipped += 1
+      else:
+        io = iobuf.data_buffer(32)
+        self.cpu.rdmem32(sector_adr, n, io)
+        data = io.to_bytes('le')
+      mf.wr_bytes(data)
+      if data == erased:
+        if ranges and ranges[-1][1] == sector_adr:
+          ranges[-1][1] += _flash_sector_size
+        else:
+          ranges.append([sector_adr, sector_adr + _flash_sector_size])
     mf.close()
+    # write the manifest of blank sectors
+    f = open('%s.blank' % name, 'w')
+    f.write('# %08x %08x: %d sectors of 0x%x bytes\n' % (adr, adr + (nsectors * _flash_sector_size) - 1, nsectors, _flash_sector_size))
+    f.write('# blank sectors\n')
+    f.write(''.join(['%08x %08x\n' % (start, end - 1) for (start, end) in ranges]))
+    f.close()
+    if is_blank is not None:
+      ui.put('%d blank sectors (checked on the target, not read)\n' % nskipped)
 
   def cmd_verify(self, ui, args):
     """verify memory against file"""
@@ -212,11 +349,42 @@ class mem(object):
     # adjust the address and length
     adr = util.align(adr, 32)
     n = util.nbytes_to_nwords(size, 32)
-    # read memory, verify against file object
-    mf = iobuf.verify_file(ui, 'verify %s (%d bytes):' % (name, n * 4), name, n * 4)
-    self.cpu.rdmem32(adr, n, mf)
+    # read memory a block at a time, verify against file object
+    mf = iobuf.verify_file(ui, 'verify %s (%d bytes):' % (name, n * 4), name, n * 4, adr = adr, block_size = _rd_block_size)
+    k = _rd_block_size / 4
+    for i in xrange(0, n, k):
+      io = iobuf.data_buffer(32)
+      self.rdmem32(adr + (i * 4), min(k, n - i), io)
+      mf.wr_buffer(io)
     mf.close()
 
+  def cmd_file2mem(self, ui, args):
+    """read from file, write to memory"""
+    x = util.file_mem_args(ui, args, self.cpu.device)
+    if x is None:
+      return
+    (name, adr, size) = x
+    # check the file
+    filesize = util.file_arg(ui, name)
+    if filesize is None:
+      return
+    # round up the filesize - the io object will return 0xff for any bytes beyond EOF
+    filesize = util.roundup(filesize, 32)
+    if size is None or size > filesize:
+      # no length on the command line (or more than the file) - write the filesize
+      size = filesize
+    # adjust the address and length
+    adr = util.align(adr, 32)
+    n = util.nbytes_to_nwords(size, 32)
+    # read the file a block at a time, write to memory
+    mf = iobuf.read_file(ui, 'writing %s (%d bytes):' % (name, n * 4), name, n * 4)
+    k = _rd_block_size / 4
+    for i in xrange(0, n, k):
+      m = min(k, n - i)
+      self.cpu.wrmem(adr + (i * 4), m, mf.rd_buffer(32, m))
+    mf.close(rate = True)
+    self.da_cache.invalidate(adr, n * 4)
+
   def __display(self, ui, args, width):
     """display memory: as width bits"""
     x = util.mem_args(ui, args, self.cpu.device)
@@ -244,7 +412,7 @@ class mem(object):
     for i in xrange(n/16):
       # read 4, 32-bit words (16 bytes per line)
       io = iobuf.data_buffer(32)
-      self.cpu.rdmem(adr, 4, io)
+      self.rdmem32(adr, 4, io)
       # work out the data string
       io.convert(width, 'le')
       data_str = str(io)
@@ -266,22 +434,23 @@ class mem(object):
     """display memory 32 bits"""
     self.__display(ui, args, 32)
 
-  def __analyze(self, buf, ofs, n):
-    """return a character to respresent the buffer"""
-    b0 = buf[ofs]
-    if b0 is None:
-      c = ' '
-    elif b0 == 0:
-      c = '-'
-    elif b0 == 0xff:
-      c = '.'
-    else:
-      c = '$'
-    for i in range(1, n):
-      k = buf[ofs + i]
-      if k is not None and k != b0:
-        return '$'
-    return c
+  def cmd_disassemble(self, ui, args):
+    """disassemble memory"""
+    x = util.mem_args(ui, args, self.cpu.device)
+    if x is None:
+      return
+    (adr, n) = x
+    if n == 0:
+      return
+    if n is None:
+      n = 0x40
+    # round down address to 32-bit byte boundary
+    adr &= ~3
+    # round up n to an integral multiple of 4 bytes
+    n = (n + 3) & ~3
+    for (pc, opcode, mid, operands, length) in da.disassemble_blocks(self.rd_blocks(adr, n), adr, cache = self.da_cache):
+      opcode_str = ('%02x', '%04x', '%06x', '%08x')[length - 1] % opcode
+      ui.put('%08x: %-8s %s\n' % (pc, opcode_str, da.da_format(mid, operands)))
 
   def cmd_pic(self, ui, args):
     """display a pictorial summary of memory"""
@@ -308,32 +477,27 @@ class mem(object):
     rows = int(math.ceil(n / (float(cols) * float(bps))))
     # bytes per row
     bpr = cols * bps
-    # work out the none padding
-    nwords = n / 4
-    nwords_displayed = (((cols * rows * bps) + 3) & ~3) / 4
-    none_pad = [None,] * ((nwords_displayed - nwords) * 4)
-    # read the memory
-    if n > (16 << 10):
-      ui.put('reading memory ...\n')
-    data = iobuf.data_buffer(32)
-    self.cpu.rdmem32(adr, nwords, data)
-    data.convert8(mode = 'le')
-    # add the none padding
-    data.buf.extend(none_pad)
     # display the summary
     ui.put("'.' all ones, '-' all zeroes, '$' various\n")
     ui.put('%d (0x%x) bytes per symbol\n' % (bps, bps))
     ui.put('%d (0x%x) bytes per row\n' % (bpr, bpr))
     ui.put('%d cols x %d rows\n' % (cols, rows))
-    # display the matrix
+    # stream the memory a block at a time and display the matrix a row at a time
+    blocks = self.rd_blocks(adr, n)
+    data = ''
     ofs = 0
     for y in range(rows):
-      s = []
-      adr_str = '0x%08x: ' % (adr + ofs)
-      for x in range(cols):
-        s.append(self.__analyze(data.buf, ofs, bps))
-        ofs += bps
-      ui.put('%s%s\n' % (adr_str, ''.join(s)))
+      # read enough memory for this row
+      while len(data) < bpr:
+        block = next(blocks, None)
+        if block is None:
+          break
+        data = ''.join([data, block])
+      row = data[:bpr]
+      data = data[bpr:]
+      s = [pic_symbol(row[i:i + bps]) for i in xrange(0, bpr, bps)]
+      ui.put('0x%08x: %s\n' % (adr + ofs, ''.join(s)))
+      ofs += bpr
 
   def cmd_md5(self, ui, args):
     """calculate an md5 hash of memory"""
@@ -354,7 +518,7 @@ class mem(object):
       ui.put('reading memory ...\n')
     data = iobuf.data_buffer(32)
     t_start = time.time()
-    self.cpu.rdmem(adr, n/4, data)
+    self.rdmem32(adr, n/4, data)
     t_end = time.time()
     ui.put('%s\n' % data.md5('le'))
     ui.put('%.2f KiB/sec\n' % (float(n)/((t_end - t_start) * 1024.0)))
@@ -385,6 +549,7 @@ class mem(object):
     t_start = time.time()
     self.cpu.wrmem(adr, nx, wrbuf)
     t_end = time.time()
+    self.da_cache.invalidate(adr, n)
     ui.put('write %.2f KiB/sec\n' % (float(n)/((t_end - t_start) * 1024.0)))
     # read it from memory
     rdbuf = iobuf.data_buffer(width)
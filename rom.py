@@ -0,0 +1,433 @@
+# -----------------------------------------------------------------------------
+"""
+ROM Images
+
+Dumps of the on-chip ROM are kept in the firmware directory. They are used
+to annotate addresses and disassemble ROM code without reading the target.
+The code images are indexed (function entry points, call/branch targets and
+l32r literal references) once, and the index is cached on disk.
+"""
+# -----------------------------------------------------------------------------
+
+import os
+import gzip
+import json
+import bisect
+import hashlib
+
+import util
+import iobuf
+import cfg
+import da
+
+# -----------------------------------------------------------------------------
+
+_help_rom_adr = (
+  ('<address>', 'address (hex)'),
+)
+
+_help_rom_shadow = (
+  ('[off]', 'verify the rom images against the target and read rom from them'),
+  ('  off', 'read rom from the target'),
+)
+
+_help_rom_region = (
+  ('<address/name> <len>', 'rom region'),
+  ('  address', 'address of rom (hex)'),
+  ('  name', 'name of rom region - see "map" command'),
+  ('  len', 'length of rom region (hex) - defaults to 0x40'),
+)
+
+# -----------------------------------------------------------------------------
+
+# bump this when the index contents change
+_index_version = 2
+
+# maximum number of sweeps when building the index
+_index_passes = 4
+
+# mnemonic ids of interest
+_id_entry = da.da_decode(0x000036, 0)[0]
+_id_l32r = da.da_decode(0x000001, 0)[0]
+_id_calls = frozenset([da.da_decode(0x000005 | (n << 4), 0)[0] for n in range(4)])
+_id_windowed_calls = frozenset([da.da_decode(0x000005 | (n << 4), 0)[0] for n in range(1, 4)])
+
+def _islands(adrs):
+  """return sorted [start, end) ranges covering the literal words at adrs"""
+  islands = []
+  for adr in adrs:
+    if islands and islands[-1][1] >= adr:
+      islands[-1][1] = max(islands[-1][1], adr + 4)
+    else:
+      islands.append([adr, adr + 4])
+  return [tuple(x) for x in islands]
+
+def build_index(data, base):
+  """
+  disassemble a code image and return an index
+  functions: sorted function entry points
+  islands: sorted [start, end) ranges of literal pool data
+  calls, branches, literals: target address -> list of referencing addresses
+  """
+  end = base + len(data)
+  mem = bytearray(data)
+  def entry_at(adr):
+    i = adr - base
+    if i < 0 or i + 3 > len(mem):
+      return False
+    opcode = mem[i] | (mem[i + 1] << 8) | (mem[i + 2] << 16)
+    return da.da_decode(opcode, adr)[0] == _id_entry
+  # A linear sweep goes off the rails at literal pools and padding. Re-sweep
+  # from the known function entry points, with the literal pools as data,
+  # until the set of functions is stable.
+  functions = set()
+  islands = ()
+  for i in range(_index_passes):
+    cuts = sorted(functions)
+    records = []
+    for (start, stop) in zip([base] + cuts, cuts + [end]):
+      records.extend(da.disassemble(mem, base, start, stop, islands))
+    found = set()
+    literals = set()
+    for (adr, opcode, mid, operands, length) in records:
+      if mid == _id_entry and (adr & 3) == 0:
+        found.add(adr)
+      elif mid in _id_windowed_calls and entry_at(operands[0]):
+        found.add(operands[0])
+      elif mid == _id_l32r and base <= operands[1] < end:
+        literals.add(operands[1])
+    islands = _islands(sorted(literals))
+    if found == functions:
+      break
+    functions = found
+  # build the cross references from the final sweep
+  starts = set([x[0] for x in records])
+  calls = {}
+  branches = {}
+  literals = {}
+  for (adr, opcode, mid, operands, length) in records:
+    if mid == _id_l32r:
+      literals.setdefault(operands[1], []).append(adr)
+    elif mid in da.target_ids:
+      target = operands[-1]
+      if mid in _id_calls:
+        calls.setdefault(target, []).append(adr)
+        # call0 targets have no entry instruction
+        if target in starts:
+          functions.add(target)
+      else:
+        branches.setdefault(target, []).append(adr)
+  return {
+    'functions': sorted(functions),
+    'islands': islands,
+    'calls': calls,
+    'branches': branches,
+    'literals': literals,
+  }
+
+# -----------------------------------------------------------------------------
+
+class image(object):
+  """a rom image"""
+
+  def __init__(self, name, filename, base, code = True):
+    """
+    name = name of the rom region
+    filename = gzipped rom dump
+    base = address of the rom
+    code = True if the rom contains code to be indexed
+    """
+    self.name = name
+    self.filename = filename
+    self.base = base
+    self.code = code
+    self.index_name = '%s.idx.gz' % os.path.splitext(filename)[0]
+    self.shadow_name = os.path.splitext(filename)[0]
+    self._data = None
+    self.functions = None
+
+  def data(self):
+    """return the rom contents"""
+    if self._data is None:
+      f = gzip.open(self.filename, 'rb')
+      self._data = f.read()
+      f.close()
+    return self._data
+
+  def md5(self):
+    """return the md5 digest of the rom contents"""
+    return hashlib.md5(self.data()).hexdigest()
+
+  def source(self):
+    """return a memory mapped source for the decompressed rom"""
+    data = self.data()
+    if not os.path.isfile(self.shadow_name) or os.path.getsize(self.shadow_name) != len(data):
+      f = open(self.shadow_name, 'wb')
+      f.write(data)
+      f.close()
+    return iobuf.file_source(self.shadow_name)
+
+  def contains(self, adr):
+    """return True if adr is within the rom"""
+    return self.base <= adr < self.base + len(self.data())
+
+  def load_index(self, ui):
+    """load the index from disk, build and save it if needed"""
+    if self.functions is not None:
+      return
+    if not self.code:
+      self.set_index({'functions': [], 'islands': [], 'calls': {}, 'branches': {}, 'literals': {}})
+      return
+    md5 = self.md5()
+    try:
+      f = gzip.open(self.index_name, 'rb')
+      x = json.load(f)
+      f.close()
+    except (IOError, ValueError):
+      x = None
+    if x is not None and x['version'] == _index_version and x['md5'] == md5:
+      # json keys are strings
+      for k in ('calls', 'branches', 'literals'):
+        x[k] = dict([(int(adr), refs) for (adr, refs) in x[k].items()])
+      self.set_index(x)
+      return
+    ui.put('%s: building index ...\n' % self.name)
+    x = build_index(self.data(), self.base)
+    self.set_index(x)
+    x['version'] = _index_version
+    x['md5'] = md5
+    try:
+      f = gzip.open(self.index_name, 'wb')
+      json.dump(x, f)
+      f.close()
+    except IOError:
+      ui.put('%s: unable to save index to %s\n' % (self.name, self.index_name))
+
+  def set_index(self, x):
+    """set the index contents"""
+    self.functions = x['functions']
+    # json has no tuples
+    self.islands = tuple([tuple(r) for r in x['islands']])
+    self.calls = x['calls']
+    self.branches = x['branches']
+    self.literals = x['literals']
+
+  def function(self, adr):
+    """return the entry point of the function containing adr - or None"""
+    i = bisect.bisect_right(self.functions, adr)
+    if i == 0:
+      return None
+    return self.functions[i - 1]
+
+  def rd32(self, adr):
+    """read a 32-bit little endian word from the rom"""
+    i = adr - self.base
+    x = bytearray(self.data()[i:i + 4])
+    return x[0] | (x[1] << 8) | (x[2] << 16) | (x[3] << 24)
+
+# -----------------------------------------------------------------------------
+
+class rom(object):
+  """the rom images for a target"""
+
+  def __init__(self, images, device, mem):
+    """
+    images = tuple of rom images
+    device = soc device (region names)
+    mem = memory object (rom shadowing)
+    """
+    self.images = images
+    self.device = device
+    self.mem = mem
+    self.menu = (
+      ('cfg', self.cmd_cfg, _help_rom_adr),
+      ('da', self.cmd_disassemble, _help_rom_region),
+      ('fn', self.cmd_function, _help_rom_adr),
+      ('info', self.cmd_info),
+      ('shadow', self.cmd_shadow, _help_rom_shadow),
+      ('xref', self.cmd_xref, _help_rom_adr),
+    )
+
+  def lookup(self, ui, adr):
+    """return the indexed rom image containing adr - or None"""
+    for x in self.images:
+      if x.contains(adr):
+        x.load_index(ui)
+        return x
+    return None
+
+  def symbol(self, ui, adr):
+    """return a symbolic name for adr - or None"""
+    x = self.lookup(ui, adr)
+    if x is None:
+      return None
+    fn = x.function(adr)
+    if fn is None:
+      return None
+    if fn == adr:
+      return 'sub_%08x' % fn
+    return 'sub_%08x+0x%x' % (fn, adr - fn)
+
+  def annotate(self, ui, adr, mid, operands):
+    """return a comment string for a decoded rom instruction"""
+    if mid == _id_l32r:
+      x = self.lookup(ui, operands[1])
+      if x is None:
+        return ''
+      val = x.rd32(operands[1])
+      s = self.symbol(ui, val)
+      if s is None:
+        # peripheral/register address
+        s = self.device.address_name(val)
+      if s is None:
+        return '0x%08x' % val
+      return '0x%08x %s' % (val, s)
+    if mid in da.target_ids:
+      s = self.symbol(ui, operands[-1])
+      return ('', s)[s is not None]
+    return ''
+
+  def cmd_disassemble(self, ui, args):
+    """disassemble rom"""
+    x = util.mem_args(ui, args, self.device)
+    if x is None:
+      return
+    (adr, n) = x
+    if n == 0:
+      return
+    if n is None:
+      n = 0x40
+    x = self.lookup(ui, adr)
+    if x is None:
+      ui.put('0x%08x is not in rom\n' % adr)
+      return
+    n = min(n, x.base + len(x.data()) - adr)
+    data = x.data()
+    # sweep from the function entry (if any) so we are in step with the code
+    start = x.function(adr)
+    if start is None:
+      start = adr
+    for (pc, opcode, mid, operands, length) in da.disassemble(data, x.base, start, adr + n, x.islands):
+      if pc < adr:
+        continue
+      if x.function(pc) == pc:
+        ui.put('%s:\n' % self.symbol(ui, pc))
+      opcode_str = ('%02x', '%04x', '%06x', '%08x')[length - 1] % opcode
+      s = '%08x: %-8s %s' % (pc, opcode_str, da.da_format(mid, operands))
+      comment = self.annotate(ui, pc, mid, operands)
+      if comment:
+        s = '%-48s ; %s' % (s, comment)
+      ui.put('%s\n' % s)
+
+  def cmd_cfg(self, ui, args):
+    """display the basic blocks of a rom function"""
+    if util.wrong_argc(ui, args, (1,)):
+      return
+    adr = util.sex_arg(ui, args[0], 32)
+    if adr is None:
+      return
+    x = self.lookup(ui, adr)
+    if x is None:
+      ui.put('0x%08x is not in rom\n' % adr)
+      return
+    fn = x.function(adr)
+    if fn is None:
+      fn = adr
+    g = cfg.cfg(x.data(), x.base)
+    g.explore((fn,), follow_calls = False)
+    ui.put('%s:\n' % self.symbol(ui, fn))
+    clist = []
+    for b in g.function_blocks(fn):
+      succs = ' '.join(['%08x' % adr for adr in b.succs])
+      calls = ' '.join([self.symbol(ui, adr) or '%08x' % adr for adr in b.calls])
+      clist.append(['%08x-%08x' % (b.start, b.end - 1), '%d' % len(b.insns), succs, calls])
+    ui.put('%s\n' % util.display_cols(clist, [0, 0, 0, 0]))
+
+  def cmd_function(self, ui, args):
+    """display the rom function containing an address"""
+    if util.wrong_argc(ui, args, (1,)):
+      return
+    adr = util.sex_arg(ui, args[0], 32)
+    if adr is None:
+      return
+    x = self.lookup(ui, adr)
+    if x is None:
+      ui.put('0x%08x is not in rom\n' % adr)
+      return
+    fn = x.function(adr)
+    if fn is None:
+      ui.put('0x%08x is not in a function\n' % adr)
+      return
+    i = x.functions.index(fn)
+    end = (x.functions[i + 1:] or [x.base + len(x.data())])[0]
+    ui.put('%s: 0x%08x-0x%08x %s\n' % (self.symbol(ui, fn), fn, end - 1, util.memsize(end - fn)))
+    callers = x.calls.get(fn, [])
+    ui.put('%d callers\n' % len(callers))
+    clist = [['%08x' % site, self.symbol(ui, site)] for site in callers]
+    if clist:
+      ui.put('%s\n' % util.display_cols(clist, [0, 0]))
+
+  def cmd_xref(self, ui, args):
+    """display references to an address"""
+    if util.wrong_argc(ui, args, (1,)):
+      return
+    adr = util.sex_arg(ui, args[0], 32)
+    if adr is None:
+      return
+    clist = []
+    for x in self.images:
+      if not x.code:
+        continue
+      x.load_index(ui)
+      for (kind, refs) in (('call', x.calls), ('branch', x.branches), ('l32r', x.literals)):
+        for site in refs.get(adr, []):
+          clist.append(['%08x' % site, kind, self.symbol(ui, site)])
+      # literals holding the address (e.g. callx targets)
+      for (lit, refs) in sorted(x.literals.items()):
+        if x.rd32(lit) == adr:
+          for site in refs:
+            clist.append(['%08x' % site, 'l32r =', self.symbol(ui, site)])
+    if not clist:
+      ui.put('no references to 0x%08x\n' % adr)
+      return
+    ui.put('%s\n' % util.display_cols(clist, [0, 0, 0]))
+
+  def cmd_shadow(self, ui, args):
+    """read rom from the host images"""
+    if util.wrong_argc(ui, args, (0, 1)):
+      return
+    self.mem.rm_shadows()
+    if len(args) == 1:
+      if args[0] != 'off':
+        ui.put(util.inv_arg)
+        return
+      ui.put('rom is read from the target\n')
+      return
+    for x in self.images:
+      # one-time check of the image against the target
+      size = len(x.data())
+      ui.put('%s: checking %s ... ' % (x.name, util.memsize(size)))
+      h = hashlib.md5()
+      for block in self.mem.rd_blocks(x.base, size, shadow = False):
+        h.update(block)
+      if h.hexdigest() != x.md5():
+        ui.put('image differs, read from target\n')
+        continue
+      self.mem.add_shadow(x.base, size, x.source())
+      ui.put('ok, read from %s\n' % x.shadow_name)
+
+  def cmd_info(self, ui, args):
+    """display rom information"""
+    clist = []
+    for x in self.images:
+      x.load_index(ui)
+      size = len(x.data())
+      region = ': %08x %08x %s' % (x.base, x.base + size - 1, util.memsize(size))
+      if x.code:
+        s = '%d functions, %d call targets' % (len(x.functions), len(x.calls))
+      else:
+        s = 'data'
+      clist.append([x.name, region, s])
+    ui.put('%s\n' % util.display_cols(clist, [0, 0, 0]))
+
+# -----------------------------------------------------------------------------
@@ -8,15 +8,45 @@ specific to a SoC chip.
 """
 #------------------------------------------------------------------------------
 
+import time
+import array
+import bisect
+import struct
 import util
+import iobuf
 
 #------------------------------------------------------------------------------
 
 help_regs = (
   ('<cr>', 'display cpu registers'),
-  ('[name]', 'display registers for peripheral')
+  ('[name]', 'display registers for peripheral'),
+  ('snapshot [snap]', 'save all peripheral register values'),
+  ('diff [snap0] [snap1]', 'display changed registers (default: the last two snapshots)'),
+  ('', 'with one snapshot name, diff against the current values'),
 )
 
+# 32-bit unsigned array typecode
+_u32 = ('L', 'I')[array.array('I').itemsize == 4]
+
+# transaction writes up to this many words apart are merged into one block write
+_gap_words = 2
+
+#------------------------------------------------------------------------------
+# Peripherals, registers and fields are also direct instance attributes of
+# their parent, so scripted accesses (e.g. soc.uart0.conf0.rd()) don't go
+# through the __getattr__ fallbacks. Names that clash with an attribute of
+# the parent are left to __getattr__ (or the dictionary).
+
+def _set_direct(obj, attrs, name, x):
+  """make x a direct attribute of obj unless the name is taken"""
+  if name not in attrs and not hasattr(type(obj), name):
+    obj.__dict__[name] = x
+
+def _clr_direct(obj, name, x):
+  """remove a direct attribute set with _set_direct"""
+  if obj.__dict__.get(name) is x:
+    del obj.__dict__[name]
+
 #------------------------------------------------------------------------------
 
 class interrupt(object):
@@ -44,58 +74,62 @@ class field(object):
 
   def __init__(self):
     self.fmt = None
+    self.enumvals = None
     self.cached_val = None
 
+  def compile(self):
+    """precompute the mask, shift, value names and display name"""
+    self.shift = self.lsb
+    self.mask = ((1 << (self.msb - self.lsb + 1)) - 1) << self.lsb
+    self.val_names = None
+    if self.enumvals is not None and len(self.enumvals) >= 1:
+      # find the enumvals with usage 'read', or just find one
+      for e in self.enumvals:
+        if e.usage == 'read':
+          break
+      self.val_names = dict([(k, v.name) for (k, v) in e.enumval.items()])
+    if self.msb == self.lsb:
+      self.label = '  %s[%d]' % (self.name, self.lsb)
+    else:
+      self.label = '  %s[%d:%d]' % (self.name, self.msb, self.lsb)
+
+  def value_name(self, x):
+    """return the name for an extracted field value"""
+    if self.fmt is not None:
+      return self.fmt(x)
+    if self.val_names is not None:
+      return self.val_names.get(x, '')
+    return ''
+
   def field_name(self, val):
     """return the name for the field value"""
-    mask = ((1 << (self.msb - self.lsb + 1)) - 1) << self.lsb
-    val = (val & mask) >> self.lsb
-    val_name = ''
-    if callable(self.fmt):
-      val_name = self.fmt(val)
-    else:
-      if self.enumvals is not None and len(self.enumvals) >= 1:
-        # find the enumvals with usage 'read', or just find one
-        for e in self.enumvals:
-          if e.usage == 'read':
-            break
-        if e.enumval.has_key(val):
-          val_name = e.enumval[val].name
-    return val_name
-
-  def display(self, val):
+    return self.value_name((val & self.mask) >> self.shift)
+
+  def display(self, val, x = None, val_name = None):
     """return display columns (name, val, '', descr) for this field"""
-    mask = ((1 << (self.msb - self.lsb + 1)) - 1) << self.lsb
-    val = (val & mask) >> self.lsb
+    if x is None:
+      x = (val & self.mask) >> self.shift
+      val_name = self.value_name(x)
     # work out if the value has changed since we last displayed it
     changed = '  '
     if self.cached_val is None:
-      self.cached_val = val
-    elif self.cached_val != val:
-      self.cached_val = val
+      self.cached_val = x
+    elif self.cached_val != x:
+      self.cached_val = x
       changed = ' *'
-    if self.msb == self.lsb:
-      name = '  %s[%d]' % (self.name, self.lsb)
+    if x < 10:
+      val_str = ': %d %s%s' % (x, val_name, changed)
     else:
-      name = '  %s[%d:%d]' % (self.name, self.msb, self.lsb)
-    val_name = ''
-    if callable(self.fmt):
-      val_name = self.fmt(val)
-    else:
-      if self.enumvals is not None and len(self.enumvals) >= 1:
-        # find the enumvals with usage 'read', or just find one
-        for e in self.enumvals:
-          if e.usage == 'read':
-            break
-        if e.enumval.has_key(val):
-          val_name = e.enumval[val].name
-    val_str = (': 0x%x %s%s' % (val, val_name, changed), ': %d %s%s' % (val, val_name, changed))[val < 10]
-    return [name, val_str, '', self.description]
+      val_str = ': 0x%x %s%s' % (x, val_name, changed)
+    return [self.label, val_str, '', self.description]
 
 #------------------------------------------------------------------------------
 
 class register(object):
 
+  # register attributes - anything else in the fields dictionary is a field
+  _attrs = frozenset(('name', 'description', 'size', 'offset', 'fields', 'field_order', 'parent', 'cpu', 'cached_val'))
+
   def __init__(self):
     self.cached_val = None
 
@@ -103,6 +137,15 @@ class register(object):
     """make the field name a class attribute"""
     return self.fields[name]
 
+  def __setattr__(self, name, val):
+    """assigning to a field name modifies the field in the hardware register"""
+    fields = self.__dict__.get('fields')
+    if name not in register._attrs and fields and fields.has_key(name):
+      f = fields[name]
+      self.modify((val << f.shift) & f.mask, f.mask)
+    else:
+      object.__setattr__(self, name, val)
+
   def bind_cpu(self, cpu):
     """bind a cpu to the register"""
     self.cpu = cpu
@@ -119,23 +162,39 @@ class register(object):
   def wr(self, val, idx = 0):
     return self.cpu.wr(self.adr(idx, self.size), val, self.size)
 
+  def modify(self, set_mask, clr_mask, idx = 0):
+    """read-modify-write: val = (val & ~clr_mask) | set_mask"""
+    self.wr((self.rd(idx) & ~clr_mask) | set_mask, idx)
+
   def set_bit(self, val, idx = 0):
-    self.wr(self.rd(idx) | val, idx)
+    self.modify(val, 0, idx)
 
   def clr_bit(self, val, idx = 0):
-    self.wr(self.rd(idx) & ~val, idx)
+    self.modify(0, val, idx)
 
   def field_list(self):
     """return an ordered fields list"""
-    # build a list of fields in most significant bit order
-    f_list = self.fields.values()
-    f_list.sort(key = lambda x : x.msb, reverse = True)
-    return f_list
+    # fields in most significant bit order (built by make_registers)
+    return list(self.field_order)
+
+  def decode(self, val):
+    """return [(field, field value, value name), ...] in most significant bit order"""
+    l = []
+    for f in self.field_order:
+      x = (val & f.mask) >> f.shift
+      if f.fmt is not None:
+        l.append((f, x, f.fmt(x)))
+      elif f.val_names is not None:
+        l.append((f, x, f.val_names.get(x, '')))
+      else:
+        l.append((f, x, ''))
+    return l
 
-  def display(self, display_fields):
+  def display(self, display_fields, val = None):
     """return display columns (name, adr, val, descr) for this register"""
     adr = self.adr(0, self.size)
-    val = self.rd()
+    if val is None:
+      val = self.rd()
     # work out if the value has changed since we last displayed it
     changed = '  '
     if self.cached_val is None:
@@ -153,25 +212,75 @@ class register(object):
     clist.append([self.name, adr_str, val_str, self.description])
     # output the fields
     if display_fields and self.fields:
-      for f in self.field_list():
-        clist.append(f.display(val))
+      for (f, x, val_name) in self.decode(val):
+        clist.append(f.display(val, x, val_name))
     return clist
 
 #------------------------------------------------------------------------------
 
+# register value formats for little endian byte strings
+_unpack_fmt = {8: '<B', 16: '<H', 32: '<L'}
+
+def register_spans(registers):
+  """
+  return the contiguous 32-bit aligned address spans covering the registers
+  [(adr, nwords, registers), ...]
+  """
+  spans = []
+  for r in sorted(registers, key = lambda x : x.adr(0, x.size)):
+    start = r.adr(0, r.size) & ~3
+    end = (r.adr(0, r.size) + (r.size / 8) + 3) & ~3
+    if spans and spans[-1][1] >= start:
+      spans[-1][1] = max(spans[-1][1], end)
+      spans[-1][2].append(r)
+    else:
+      spans.append([start, end, [r,]])
+  return [(start, (end - start) / 4, regs) for (start, end, regs) in spans]
+
+def rd_spans(cpu, spans):
+  """read the spans with one block read each, return [(register, value), ...]"""
+  if getattr(cpu, 'rdmem32', None) is None:
+    # no block reads, read the registers one at a time
+    return [(r, cpu.rd(r.adr(0, r.size), r.size)) for (adr, n, regs) in spans for r in regs]
+  vals = []
+  for (adr, n, regs) in spans:
+    io = iobuf.data_buffer(32)
+    cpu.rdmem32(adr, n, io)
+    data = io.to_bytes('le')
+    for r in regs:
+      ofs = r.adr(0, r.size) - adr
+      vals.append((r, struct.unpack(_unpack_fmt[r.size], data[ofs:ofs + (r.size / 8)])[0]))
+  return vals
+
 class peripheral(object):
 
+  # peripheral attributes - these names can't be direct register attributes
+  _attrs = frozenset(('name', 'description', 'address', 'size', 'register_set', 'registers', 'spans', 'r_list', 'r_index', 'parent', 'cpu'))
+
   def __init__(self):
-    pass
+    self.spans = None
+    # cached register list and address index
+    self.r_list = None
+    self.r_index = None
 
   def __getattr__(self, name):
     """make the register name a class attribute"""
+    if name == 'registers':
+      # build the registers on first access
+      self.registers = make_registers(self, self.register_set)
+      cpu = self.__dict__.get('cpu')
+      if self.registers:
+        for r in self.registers.values():
+          _set_direct(self, peripheral._attrs, r.name, r)
+          if cpu is not None:
+            r.bind_cpu(cpu)
+      return self.registers
     return self.registers[name]
 
   def bind_cpu(self, cpu):
     """bind a cpu to the peripheral"""
     self.cpu = cpu
-    if self.registers:
+    if self.__dict__.get('registers'):
       for r in self.registers.values():
         r.bind_cpu(cpu)
 
@@ -181,11 +290,70 @@ class peripheral(object):
 
   def register_list(self):
     """return an ordered register list"""
-    # build a list of registers in address offset order
-    # tie break with the name to give a well-defined sort order
-    r_list = self.registers.values()
-    r_list.sort(key = lambda x : (x.offset << 16) + sum(bytearray(x.name)))
-    return r_list
+    if self.r_list is None:
+      # build a list of registers in address offset order
+      # tie break with the name to give a well-defined sort order
+      self.r_list = self.registers.values()
+      self.r_list.sort(key = lambda x : (x.offset, x.name))
+    return list(self.r_list)
+
+  def register_index(self):
+    """return the register address index ([start, ...], [register, ...])"""
+    if self.r_index is None:
+      r_list = sorted(self.registers.values(), key = lambda x : (x.adr(0, x.size), x.name))
+      self.r_index = ([r.adr(0, r.size) for r in r_list], r_list)
+    return self.r_index
+
+  def find_register(self, adr):
+    """return the register containing adr - or None"""
+    if not self.registers:
+      return None
+    (starts, r_list) = self.register_index()
+    i = bisect.bisect_right(starts, adr) - 1
+    if i >= 0 and adr < starts[i] + (r_list[i].size / 8):
+      return r_list[i]
+    return None
+
+  def find_registers(self, adr, end):
+    """return [(register, nbytes), ...] covering adr to end, register is None between registers"""
+    if not self.registers:
+      return [(None, end - adr)]
+    (starts, r_list) = self.register_index()
+    l = []
+    i = max(bisect.bisect_right(starts, adr) - 1, 0)
+    while adr < end:
+      if i < len(starts) and starts[i] <= adr < starts[i] + (r_list[i].size / 8):
+        # within register i
+        k = min(starts[i] + (r_list[i].size / 8), end)
+        l.append((r_list[i], k - adr))
+        adr = k
+      elif i < len(starts) and starts[i] <= adr:
+        # past register i
+        i += 1
+      else:
+        # before the next register
+        k = end
+        if i < len(starts):
+          k = min(starts[i], end)
+        l.append((None, k - adr))
+        adr = k
+    return l
+
+  def reset_registers(self):
+    """forget the cached register lists (the register set has changed)"""
+    self.spans = None
+    self.r_list = None
+    self.r_index = None
+
+  def register_spans(self):
+    """return the address spans covering the registers (see register_spans)"""
+    if self.spans is None:
+      self.spans = register_spans(self.registers.values())
+    return self.spans
+
+  def rd_registers(self):
+    """read all registers with one block read per span, return {name: value}"""
+    return dict([(r.name, val) for (r, val) in rd_spans(self.cpu, self.register_spans())])
 
   def display(self, register_name = None, fields= False):
     """return a display string for this peripheral"""
@@ -196,9 +364,10 @@ class peripheral(object):
         r = self.registers[register_name]
         clist.extend(r.display(fields))
       else:
-        # decode all registers
+        # decode all registers from a snapshot
+        vals = self.rd_registers()
         for r in self.register_list():
-          clist.extend(r.display(fields))
+          clist.extend(r.display(fields, vals[r.name]))
       return util.display_cols(clist, [0,0,0,0])
     else:
       return 'no registers for %s' % self.name
@@ -210,13 +379,170 @@ class peripheral(object):
       del self.registers[old]
       self.registers[new] = r
       r.name = new
+      _clr_direct(self, old, r)
+      _set_direct(self, peripheral._attrs, new, r)
+      self.reset_registers()
+
+# -----------------------------------------------------------------------------
+
+class transaction(object):
+  """
+  buffered register writes
+
+  with device.transaction():
+    device.ledc.conf0_hs0.wr(x)
+    ...
+
+  While the transaction is open the cpu rd/wr functions are replaced
+  with buffering versions. On commit the writes are sorted by address and
+  32-bit writes up to gap words apart are merged into block writes. The gap
+  words are registers that are read and written back with their current
+  values (one block read). The writes are optionally read back. Only the
+  last write to an address is kept, so don't use a transaction for FIFO or
+  other registers with write side effects (or use gap = 0 when a nearby
+  register has them).
+  """
+
+  def __init__(self, device, verify = False, gap = _gap_words):
+    self.device = device
+    self.cpu = device.cpu
+    self.verify = verify
+    self.gap = gap
+    # adr -> (size, val)
+    self.writes = {}
+    # failed read back verifies [(adr, wrote, read), ...]
+    self.errors = []
+    # cpu instance attributes replaced by the transaction
+    self.saved = None
+
+  def __enter__(self):
+    self.begin()
+    return self
+
+  def __exit__(self, etype, evalue, tb):
+    if etype is None:
+      self.commit()
+    else:
+      # don't write a partial configuration
+      self.abort()
+    return False
+
+  def begin(self):
+    """start buffering writes"""
+    assert self.saved is None, 'transaction is already open'
+    self.saved = dict([(name, self.cpu.__dict__.get(name)) for name in ('rd', 'wr')])
+    self.cpu_rd = self.cpu.rd
+    self.cpu_wr = self.cpu.wr
+    self.cpu.rd = self.rd
+    self.cpu.wr = self.wr
+
+  def end(self):
+    """stop buffering writes"""
+    for (name, fn) in self.saved.items():
+      if fn is None:
+        self.cpu.__dict__.pop(name, None)
+      else:
+        setattr(self.cpu, name, fn)
+    self.saved = None
+
+  def rd(self, adr, n):
+    """read - with the buffered value if there is one"""
+    x = self.writes.get(adr)
+    if x is not None and x[0] == n:
+      return x[1]
+    return self.cpu_rd(adr, n)
+
+  def wr(self, adr, val, n):
+    """buffer a write"""
+    self.writes[adr] = (n, val & ((1 << n) - 1))
+
+  def is_register(self, adr):
+    """return True if adr is within a device register"""
+    x = self.device.find(adr)
+    return x is not None and x[1] is not None
+
+  def spans(self, gap = 0):
+    """
+    return the writes as [(adr, size, [val, ...]), ...] in address order
+    32-bit writes up to gap register words apart are merged, the gap values are None.
+    """
+    spans = []
+    for (adr, (n, val)) in sorted(self.writes.items()):
+      if n == 32 and spans and spans[-1][1] == 32:
+        (start, _, vals) = spans[-1]
+        end = start + (4 * len(vals))
+        k = (adr - end) / 4
+        if (adr - end) % 4 == 0 and k <= gap and all([self.is_register(end + (i * 4)) for i in xrange(k)]):
+          vals.extend([None] * k)
+          vals.append(val)
+          continue
+      spans.append((adr, n, [val,]))
+    return spans
+
+  def commit(self):
+    """write the buffered writes to the target, return the number of target writes"""
+    self.end()
+    wrmem = getattr(self.cpu, 'wrmem', None)
+    rdmem32 = getattr(self.cpu, 'rdmem32', None)
+    # filling gaps needs block reads and writes
+    gap = 0
+    if wrmem is not None and rdmem32 is not None:
+      gap = self.gap
+    spans = self.spans(gap)
+    nwrites = 0
+    for (adr, n, vals) in spans:
+      if len(vals) > 1 and wrmem is not None:
+        data = vals
+        if None in vals:
+          # fill the gaps with the current register values
+          io = iobuf.data_buffer(32)
+          rdmem32(adr, len(vals), io)
+          data = [(x, y)[x is None] for (x, y) in zip(vals, io.buf)]
+        wrmem(adr, len(data), iobuf.data_buffer(32, data))
+        nwrites += 1
+      else:
+        for (i, val) in enumerate(vals):
+          self.cpu.wr(adr + (i * (n / 8)), val, n)
+        nwrites += len(vals)
+    if self.verify:
+      self.errors = []
+      for (adr, n, vals) in spans:
+        if len(vals) > 1 and rdmem32 is not None:
+          io = iobuf.data_buffer(32)
+          rdmem32(adr, len(vals), io)
+          rd_vals = io.buf
+        else:
+          rd_vals = [self.cpu.rd(adr + (i * (n / 8)), n) for i in xrange(len(vals))]
+        for i in xrange(len(vals)):
+          if vals[i] is not None and rd_vals[i] != vals[i]:
+            self.errors.append((adr + (i * (n / 8)), vals[i], rd_vals[i]))
+    self.writes = {}
+    return nwrites
+
+  def abort(self):
+    """discard the buffered writes"""
+    self.end()
+    self.writes = {}
 
 # -----------------------------------------------------------------------------
 
 class soc(object):
 
+  # soc attributes - these names can't be direct peripheral attributes
+  _attrs = frozenset(('peripherals', 'interrupts', 'snapshot_registers', 'snapshots', 'snapshot_names', 'p_list', 'index', 'overlaps', 'cpu'))
+
   def __init__(self):
     self.peripherals = {}
+    # (peripheral, register) in snapshot order
+    self.snapshot_registers = None
+    # name -> (time, values)
+    self.snapshots = {}
+    self.snapshot_names = []
+    # cached peripheral list and address index
+    self.p_list = None
+    self.index = None
+    # overlapping peripherals [(p0, p1), ...]
+    self.overlaps = []
 
   def __getattr__(self, name):
     """make the peripheral name a class attribute"""
@@ -231,22 +557,156 @@ class soc(object):
   def insert(self, p):
     """insert a peripheral into the device"""
     assert self.peripherals.has_key(p.name) == False, 'device already has peripheral %s' % p.name
+    # record overlapping address ranges (e.g. memory aliases), find() returns the innermost
+    if p.size is not None:
+      for x in self.peripherals.values():
+        if x.size is not None and x.address < p.address + p.size and p.address < x.address + x.size:
+          self.overlaps.append((x, p))
     p.parent = self
     self.peripherals[p.name] = p
+    _set_direct(self, soc._attrs, p.name, p)
+    self.reset_index()
+
+  def merge(self, tables):
+    """
+    add peripherals from (name, address, size, register_set, description) tables
+    A peripheral at the same address without registers takes the register set.
+    """
+    by_address = dict([(p.address, p) for p in self.peripherals.values()])
+    for (name, address, size, register_set, description) in tables:
+      p = by_address.get(address)
+      if p is None:
+        if self.peripherals.has_key(name):
+          continue
+        p = make_peripheral(name, address, size, register_set, description)
+        self.insert(p)
+        if self.__dict__.has_key('cpu'):
+          p.bind_cpu(self.cpu)
+      elif p.register_set is None and register_set:
+        p.register_set = register_set
+        p.__dict__.pop('registers', None)
+        p.reset_registers()
+        self.snapshot_registers = None
 
   def remove(self, p):
     """remove a peripheral from the device"""
     assert self.peripherals.has_key(p.name) == True, 'device does not have peripheral %s' % p.name
     del self.peripherals[p.name]
+    _clr_direct(self, p.name, p)
+    self.overlaps = [x for x in self.overlaps if p not in x]
+    self.reset_index()
+
+  def reset_index(self):
+    """forget the cached peripheral lists (the peripheral set has changed)"""
+    self.p_list = None
+    self.index = None
+    self.snapshot_registers = None
+
+  def build_index(self):
+    """
+    build the address index: sorted non-overlapping segments
+    ([start, ...], [(end, peripheral), ...])
+    Where peripherals overlap the smallest (then highest based) one owns the segment.
+    """
+    p_list = [p for p in self.peripherals.values() if p.size is not None]
+    # segment boundaries
+    edges = set()
+    for p in p_list:
+      edges.add(p.address)
+      edges.add(p.address + p.size)
+    edges = sorted(edges)
+    starts = []
+    segments = []
+    for (start, end) in zip(edges, edges[1:]):
+      owner = None
+      for p in p_list:
+        if p.address <= start and end <= p.address + p.size:
+          if owner is None or (p.size, -p.address) < (owner.size, -owner.address):
+            owner = p
+      if owner is None:
+        continue
+      if segments and segments[-1][1] is owner and segments[-1][0] == start:
+        # extend the previous segment
+        segments[-1] = (end, owner)
+      else:
+        starts.append(start)
+        segments.append((end, owner))
+    self.index = (starts, segments)
 
   def peripheral_list(self):
     """return an ordered peripheral list"""
     # build a list of peripherals in base address order
     # base addresses for peripherals are not always unique. e.g. nordic chips
     # so tie break with the name to give a well-defined sort order
-    p_list = self.peripherals.values()
-    p_list.sort(key = lambda x : (x.address << 16) + sum(bytearray(x.name)))
-    return p_list
+    if self.p_list is None:
+      self.p_list = self.peripherals.values()
+      self.p_list.sort(key = lambda x : (x.address, x.name))
+    return list(self.p_list)
+
+  def find(self, adr, bit = None):
+    """
+    return (peripheral, register, field) for an address - or None
+    register and field may be None. The field is the one containing the bit
+    (default: the lowest bit of the addressed byte).
+    """
+    if self.index is None:
+      self.build_index()
+    (starts, segments) = self.index
+    i = bisect.bisect_right(starts, adr) - 1
+    if i < 0 or adr >= segments[i][0]:
+      return None
+    p = segments[i][1]
+    r = p.find_register(adr)
+    if r is None or not r.fields:
+      return (p, r, None)
+    if bit is None:
+      bit = (adr - r.adr(0, r.size)) * 8
+    for f in r.field_order:
+      if f.lsb <= bit <= f.msb:
+        return (p, r, f)
+    return (p, r, None)
+
+  def find_range(self, adr, n):
+    """
+    return [(peripheral, register, nbytes), ...] covering n bytes at adr
+    peripheral and register may be None.
+    """
+    if self.index is None:
+      self.build_index()
+    (starts, segments) = self.index
+    end = adr + n
+    l = []
+    i = bisect.bisect_right(starts, adr) - 1
+    while adr < end:
+      if i >= 0 and adr < segments[i][0]:
+        # within segment i
+        (k, p) = segments[i]
+        k = min(k, end)
+        l.extend([(p, r, x) for (r, x) in p.find_registers(adr, k)])
+        adr = k
+      else:
+        # before the next segment
+        i += 1
+        k = end
+        if i < len(starts):
+          k = min(starts[i], end)
+        if k > adr:
+          l.append((None, None, k - adr))
+          adr = k
+    return l
+
+  def address_name(self, adr):
+    """return a symbolic name (peripheral.register+offset) for an address - or None"""
+    x = self.find(adr)
+    if x is None:
+      return None
+    (p, r, f) = x
+    if r is None:
+      ofs = adr - p.address
+      return (p.name, '%s+0x%x' % (p.name, ofs))[ofs != 0]
+    ofs = adr - r.adr(0, r.size)
+    name = '%s.%s' % (p.name, r.name)
+    return (name, '%s+%d' % (name, ofs))[ofs != 0]
 
   def interrupt_list(self):
     """return an ordered interrupt list"""
@@ -267,9 +727,98 @@ class soc(object):
         region = ': %08x %08x %s' % (start, start + size - 1, util.memsize(size))
       clist.append([p.name, region, p.description])
     ui.put('%s\n' % util.display_cols(clist, [0,0,0]))
+    if self.overlaps:
+      # names are resolved to the innermost peripheral
+      ui.put('\noverlapping peripherals:\n')
+      clist = []
+      for (p0, p1) in sorted(self.overlaps, key = lambda x : max(x[0].address, x[1].address)):
+        start = max(p0.address, p1.address)
+        end = min(p0.address + p0.size, p1.address + p1.size) - 1
+        clist.append([p0.name, p1.name, ': %08x %08x' % (start, end)])
+      ui.put('%s\n' % util.display_cols(clist, [0,0,0]))
+
+  def transaction(self, verify = False, gap = _gap_words):
+    """return a register write transaction (see transaction)"""
+    return transaction(self, verify, gap)
+
+  def snapshot(self):
+    """read all peripheral registers, return an array of values in snapshot order"""
+    if self.snapshot_registers is None:
+      self.snapshot_registers = []
+      for p in self.peripheral_list():
+        if p.registers:
+          self.snapshot_registers.extend([(p, r) for r in p.register_list()])
+    vals = array.array(_u32)
+    p = None
+    for (x, r) in self.snapshot_registers:
+      if x is not p:
+        p = x
+        p_vals = p.rd_registers()
+      vals.append(p_vals[r.name])
+    return vals
+
+  def cmd_snapshot(self, ui, args):
+    """save all peripheral register values"""
+    if util.wrong_argc(ui, args, (0,1)):
+      return
+    if len(args) == 1:
+      name = args[0]
+    else:
+      name = 'snap%d' % len(self.snapshot_names)
+    vals = self.snapshot()
+    if self.snapshots.has_key(name):
+      self.snapshot_names.remove(name)
+    self.snapshots[name] = (time.time(), vals)
+    self.snapshot_names.append(name)
+    ui.put('%s: %d registers\n' % (name, len(vals)))
+
+  def cmd_diff(self, ui, args):
+    """display the registers that changed between two snapshots"""
+    if util.wrong_argc(ui, args, (0,1,2)):
+      return
+    if len(args) == 0:
+      if len(self.snapshot_names) < 2:
+        ui.put('need two snapshots (run "regs snapshot")\n')
+        return
+      args = self.snapshot_names[-2:]
+    for name in args:
+      if not self.snapshots.has_key(name):
+        ui.put("no snapshot named '%s'\n" % name)
+        return
+    (t0, vals0) = self.snapshots[args[0]]
+    if len(args) == 2:
+      (t1, vals1) = self.snapshots[args[1]]
+      name1 = args[1]
+    else:
+      (t1, vals1) = (time.time(), self.snapshot())
+      name1 = 'now'
+    ui.put('%s -> %s (%.1f secs)\n' % (args[0], name1, t1 - t0))
+    clist = []
+    for i in xrange(len(vals0)):
+      if vals0[i] == vals1[i]:
+        continue
+      (p, r) = self.snapshot_registers[i]
+      fmt = '0x%%0%dx' % (r.size / 4)
+      clist.append(['%s.%s' % (p.name, r.name), ': %08x' % r.adr(0, r.size), fmt % vals0[i], '-> %s' % (fmt % vals1[i])])
+      if r.fields:
+        for f in r.field_order:
+          if (vals0[i] ^ vals1[i]) & f.mask:
+            v0 = (vals0[i] & f.mask) >> f.shift
+            v1 = (vals1[i] & f.mask) >> f.shift
+            clist.append([f.label, '', '0x%x %s' % (v0, f.value_name(v0)), '-> 0x%x %s' % (v1, f.value_name(v1))])
+    if not clist:
+      ui.put('no changes\n')
+      return
+    ui.put('%s\n' % util.display_cols(clist, [0,0,0,0]))
 
   def cmd_regs(self, ui, args):
     """display peripheral registers"""
+    if len(args) >= 1 and args[0] == 'snapshot':
+      self.cmd_snapshot(ui, args[1:])
+      return
+    if len(args) >= 1 and args[0] == 'diff':
+      self.cmd_diff(ui, args[1:])
+      return
     if util.wrong_argc(ui, args, (1,2)):
       return
     if not self.peripherals.has_key(args[0]):
@@ -327,6 +876,7 @@ def make_fields(parent, field_set):
     else:
       f.enumvals = make_enumvals(f, enum_set)
     f.parent = parent
+    f.compile()
     fields[f.name] = f
   return fields
 
@@ -341,6 +891,12 @@ def make_registers(parent, register_set):
     r.size = size
     r.offset = offset
     r.fields = make_fields(r, field_set)
+    if r.fields is None:
+      r.field_order = ()
+    else:
+      r.field_order = tuple(sorted(r.fields.values(), key = lambda x : x.msb, reverse = True))
+      for f in r.field_order:
+        _set_direct(r, register._attrs, f.name, f)
     r.parent = parent
     registers[r.name] = r
   return registers
@@ -351,7 +907,8 @@ def make_peripheral(name, address, size, register_set, description):
   p.description = description
   p.address = address
   p.size = size
-  p.registers = make_registers(p, register_set)
+  # the registers are built on first access
+  p.register_set = register_set
   return p
 
 #------------------------------------------------------------------------------
@@ -0,0 +1,162 @@
+# -----------------------------------------------------------------------------
+"""
+Target Access Statistics
+
+Count the target memory accesses made by the cpu memory API (and so by the
+soc register rd/wr functions). The counts are kept per address and mapped
+to peripherals and registers when they are displayed.
+
+Block transfers (e.g. the coalesced register reads) are spread across the
+registers they cover. The cpu methods are only wrapped while the statistics
+are turned on, so there is no overhead when they are off.
+"""
+# -----------------------------------------------------------------------------
+
+import time
+
+import util
+
+# -----------------------------------------------------------------------------
+
+_help_stats_regs = (
+  ('<cr>', 'display access statistics per register'),
+  ('[n]', 'display the n busiest registers'),
+)
+
+# cpu memory api functions that are counted: name -> (is_write, bytes function)
+_api = {
+  'rd': (False, lambda args: args[1] / 8),
+  'wr': (True, lambda args: args[2] / 8),
+  'rdmem32': (False, lambda args: args[1] * 4),
+  'wrmem': (True, lambda args: args[1] * args[2].width / 8),
+}
+
+# -----------------------------------------------------------------------------
+
+class stats(object):
+  """target access statistics"""
+
+  def __init__(self, cpu, device):
+    self.cpu = cpu
+    self.device = device
+    self.enabled = False
+    # (adr, bytes, is_write) -> [calls, secs]
+    self.counts = {}
+    self.t_start = None
+    self.menu = (
+      ('clear', self.cmd_clear),
+      ('off', self.cmd_off),
+      ('on', self.cmd_on),
+      ('regs', self.cmd_regs, _help_stats_regs),
+    )
+
+  def wrap(self, name, fn):
+    """return a counting wrapper for a cpu memory api function"""
+    (is_write, nbytes) = _api[name]
+    counts = self.counts
+    def counted(*args):
+      t = time.time()
+      x = fn(*args)
+      t = time.time() - t
+      key = (args[0], nbytes(args), is_write)
+      c = counts.get(key)
+      if c is None:
+        counts[key] = [1, t]
+      else:
+        c[0] += 1
+        c[1] += t
+      return x
+    return counted
+
+  def enable(self):
+    """start counting accesses"""
+    if self.enabled:
+      return
+    for name in _api:
+      fn = getattr(self.cpu, name, None)
+      if fn is not None:
+        # an instance attribute overrides the method
+        setattr(self.cpu, name, self.wrap(name, fn))
+    self.enabled = True
+    self.t_start = time.time()
+
+  def disable(self):
+    """stop counting accesses"""
+    if not self.enabled:
+      return
+    for name in _api:
+      if self.cpu.__dict__.has_key(name):
+        delattr(self.cpu, name)
+    self.enabled = False
+
+  def names(self, adr, nbytes):
+    """return {name: bytes} for the registers (or peripherals, or addresses) covered by a transfer"""
+    per_name = {}
+    for (p, r, k) in self.device.find_range(adr, nbytes):
+      if p is None:
+        name = '%08x' % adr
+      elif r is None:
+        name = p.name
+      else:
+        name = '%s.%s' % (p.name, r.name)
+      per_name[name] = per_name.get(name, 0) + k
+      adr += k
+    return per_name
+
+  def totals(self):
+    """return {name: [reads, writes, bytes, secs]} with names from the soc address index"""
+    totals = {}
+    for ((adr, nbytes, is_write), (n, t)) in self.counts.items():
+      # spread block transfers across the registers they cover
+      for (name, x) in self.names(adr, nbytes).items():
+        if not totals.has_key(name):
+          totals[name] = [0, 0, 0, 0.0]
+        totals[name][(0, 1)[is_write]] += n
+        totals[name][2] += n * x
+        totals[name][3] += t * x / nbytes
+    return totals
+
+  def cmd_on(self, ui, args):
+    """start counting target accesses"""
+    self.enable()
+
+  def cmd_off(self, ui, args):
+    """stop counting target accesses"""
+    self.disable()
+
+  def cmd_clear(self, ui, args):
+    """clear the access statistics"""
+    self.counts.clear()
+    self.t_start = (None, time.time())[self.enabled]
+
+  def cmd_regs(self, ui, args):
+    """display access statistics per register"""
+    if util.wrong_argc(ui, args, (0, 1)):
+      return
+    n = None
+    if len(args) == 1:
+      n = util.int_arg(ui, args[0], (1, 0xffffffff), 10)
+      if n is None:
+        return
+    if not self.counts:
+      ui.put('no accesses%s\n' % ('', ' (run "stats on")')[not self.enabled])
+      return
+    totals = self.totals()
+    names = sorted(totals, key = lambda x : (-totals[x][3], x))
+    clist = [['name', 'reads', 'writes', 'bytes', 'msecs'],]
+    for name in names[:n]:
+      (rd, wr, nbytes, t) = totals[name]
+      clist.append([name, '%d' % rd, '%d' % wr, '%d' % nbytes, '%.1f' % (t * 1000.0)])
+    ui.put('%s\n' % util.display_cols(clist, [0, 0, 0, 0, 0]))
+    # totals per target transaction
+    x = [0, 0, 0, 0.0]
+    for ((adr, nbytes, is_write), (n, t)) in self.counts.items():
+      x[(0, 1)[is_write]] += n
+      x[2] += n * nbytes
+      x[3] += t
+    ui.put('total: %d reads, %d writes, %d bytes, %.1f msecs' % (x[0], x[1], x[2], x[3] * 1000.0))
+    if self.enabled:
+      ui.put(' in %.1f secs' % (time.time() - self.t_start))
+    ui.put('\n')
+
+# -----------------------------------------------------------------------------
@@ -0,0 +1,182 @@
+# -----------------------------------------------------------------------------
+"""
+SVD Register Database Import
+
+Read a CMSIS-SVD file (or a JSON file with the same tables) and return
+peripheral tables in the form used by soc.make_peripheral:
+
+peripheral: (name, address, size, register_set, description)
+register: (name, size, offset, field_set, description)
+field: (name, msb, lsb, enum_set, description)
+enum: (name, value, description)
+
+Parsing XML is slow, so the tables are cached in marshal form next to the
+source file and the cache is used while the source is unchanged.
+"""
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import marshal
+import xml.etree.cElementTree as et
+
+# -----------------------------------------------------------------------------
+
+# bump this when the cached table format changes
+_cache_version = 2
+
+# -----------------------------------------------------------------------------
+
+def _int(s):
+  """convert an svd integer string"""
+  s = s.strip().lower()
+  if s.startswith('0x'):
+    return int(s, 16)
+  if s.startswith('#'):
+    return int(s[1:].replace('x', '0'), 2)
+  return int(s, 0)
+
+def _text(e, tag, default = None):
+  """return the stripped text of a child element - or default"""
+  x = e.find(tag)
+  if x is None or x.text is None:
+    return default
+  return ' '.join(x.text.split())
+
+def _dim(e, name, offset):
+  """expand a dim array element, return [(name, offset), ...]"""
+  dim = _text(e, 'dim')
+  if dim is None:
+    return [(name, offset)]
+  n = _int(dim)
+  inc = _int(_text(e, 'dimIncrement'))
+  idx = _text(e, 'dimIndex')
+  if idx is None:
+    idx = [str(i) for i in range(n)]
+  elif '-' in idx:
+    (a, b) = idx.split('-')
+    idx = [str(i) for i in range(int(a), int(b) + 1)]
+  else:
+    idx = idx.split(',')
+  name = name.replace('[%s]', '%s')
+  return [(name.replace('%s', idx[i]), offset + (i * inc)) for i in range(n)]
+
+def _fields(r):
+  """return the field set for a register element"""
+  fields = r.find('fields')
+  if fields is None:
+    return None
+  field_set = []
+  for f in fields.findall('field'):
+    if _text(f, 'bitOffset') is not None:
+      lsb = _int(_text(f, 'bitOffset'))
+      msb = lsb + _int(_text(f, 'bitWidth', '1')) - 1
+    elif _text(f, 'lsb') is not None:
+      lsb = _int(_text(f, 'lsb'))
+      msb = _int(_text(f, 'msb'))
+    else:
+      (msb, lsb) = [int(x) for x in _text(f, 'bitRange').strip('[]').split(':')]
+    enum_set = None
+    ev = f.find('enumeratedValues')
+    if ev is not None:
+      enum_set = []
+      for x in ev.findall('enumeratedValue'):
+        val = _text(x, 'value')
+        if val is not None:
+          enum_set.append((_text(x, 'name'), _int(val), _text(x, 'description', '')))
+      enum_set = (tuple(enum_set), None)[len(enum_set) == 0]
+    field_set.append((_text(f, 'name').lower(), msb, lsb, enum_set, _text(f, 'description', '')))
+  return tuple(field_set)
+
+def _cluster(e, prefix, base, size, register_set):
+  """add the registers (and nested clusters) of a registers/cluster element"""
+  for x in e:
+    if x.tag == 'register':
+      rsize = _int(_text(x, 'size', str(size)))
+      field_set = _fields(x)
+      description = _text(x, 'description', '')
+      for (name, offset) in _dim(x, _text(x, 'name'), base + _int(_text(x, 'addressOffset'))):
+        register_set.append(('%s%s' % (prefix, name.lower()), rsize, offset, field_set, description))
+    elif x.tag == 'cluster':
+      # cluster registers are named <cluster>_<register>
+      csize = _int(_text(x, 'size', str(size)))
+      for (name, offset) in _dim(x, _text(x, 'name'), base + _int(_text(x, 'addressOffset'))):
+        _cluster(x, '%s%s_' % (prefix, name.lower()), offset, csize, register_set)
+
+def _registers(p, size):
+  """return the register set for a peripheral element"""
+  regs = p.find('registers')
+  if regs is None:
+    return None
+  register_set = []
+  _cluster(regs, '', 0, size, register_set)
+  return tuple(register_set)
+
+def parse_svd(fname):
+  """parse a CMSIS-SVD file, return the peripheral tables"""
+  device = et.parse(fname).getroot()
+  size = _int(_text(device, 'size', '32'))
+  peripherals = device.find('peripherals').findall('peripheral')
+  # derivedFrom may name a peripheral defined later in the file
+  elements = dict([(_text(p, 'name'), p) for p in peripherals])
+  tables = []
+  for p in peripherals:
+    name = _text(p, 'name').lower()
+    base = p
+    if p.get('derivedFrom') is not None:
+      # the registers (and defaults) come from another peripheral
+      base = elements[p.get('derivedFrom')]
+    address = _int(_text(p, 'baseAddress'))
+    block = p.find('addressBlock')
+    if block is None:
+      block = base.find('addressBlock')
+    psize = None
+    if block is not None:
+      psize = _int(_text(block, 'size'))
+    description = _text(p, 'description', _text(base, 'description', ''))
+    tables.append((name, address, psize, _registers(base, size), description))
+  return tuple(tables)
+
+def _tuples(x):
+  """convert json lists to tuples"""
+  if isinstance(x, list):
+    return tuple([_tuples(y) for y in x])
+  if isinstance(x, unicode):
+    return str(x)
+  return x
+
+def parse_json(fname):
+  """read a json file of peripheral tables"""
+  f = open(fname, 'r')
+  x = json.load(f)
+  f.close()
+  return _tuples(x['peripherals'])
+
+# -----------------------------------------------------------------------------
+
+def load(fname):
+  """return the peripheral tables for an svd/json file, using the cache if possible"""
+  cache_name = '%s.cache' % fname
+  st = os.stat(fname)
+  key = (_cache_version, st.st_size, int(st.st_mtime))
+  try:
+    f = open(cache_name, 'rb')
+    (cache_key, tables) = marshal.load(f)
+    f.close()
+    if cache_key == key:
+      return tables
+  except (IOError, EOFError, ValueError, TypeError):
+    pass
+  if fname.endswith('.json'):
+    tables = parse_json(fname)
+  else:
+    tables = parse_svd(fname)
+  try:
+    f = open(cache_name, 'wb')
+    marshal.dump((key, tables), f)
+    f.close()
+  except IOError:
+    pass
+  return tables
+
+# -----------------------------------------------------------------------------
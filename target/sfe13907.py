@@ -63,7 +63,10 @@ Connection to ARM 20 Pin JTAG:
 import cli
 import esp32
 import mem
+import rom
 import soc
+import stats
+import watch
 
 # -----------------------------------------------------------------------------
 
@@ -82,6 +85,13 @@ default_itf = {
 _ofs = 0
 _ir_chain = (esp32.XTENSA_IRLEN, esp32.XTENSA_IRLEN)
 
+# ROM dumps (see firmware/get.sh)
+# irom1 is on the data bus, so it has no code to index.
+_roms = (
+  ('irom0', 'firmware/sfe13907/irom0.bin.gz', 0x40000000, True),
+  ('irom1', 'firmware/sfe13907/irom1.bin.gz', 0x3ff90000, False),
+)
+
 # -----------------------------------------------------------------------------
 
 class target(object):
@@ -94,6 +104,9 @@ class target(object):
     self.cpu = esp32.xtensa(ui, jtag_driver, _ofs, _ir_chain, self.soc)
     self.soc.bind_cpu(self.cpu)
     self.mem = mem.mem(self.cpu)
+    self.rom = rom.rom([rom.image(*x) for x in _roms], self.soc, self.mem)
+    self.watch = watch.watch(self.cpu, self.soc)
+    self.stats = stats.stats(self.cpu, self.soc)
 
     self.menu_root = (
       ('esp32', self.cpu.menu, 'esp32 functions'),
@@ -104,6 +117,9 @@ class target(object):
       ('map', self.soc.cmd_map),
       ('regs', self.cmd_regs, soc.help_regs),
       ('mem', self.mem.menu, 'memory functions'),
+      ('rom', self.rom.menu, 'rom functions'),
+      ('stats', self.stats.menu, 'target access statistics'),
+      ('watch', self.watch.menu, 'register watch functions'),
     )
 
     self.ui.cli.set_root(self.menu_root)
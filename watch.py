@@ -0,0 +1,171 @@
+# -----------------------------------------------------------------------------
+"""
+Register Watch
+
+Sample a set of peripheral registers over time. The registers are read
+with coalesced block reads and the samples are kept in a fixed size ring
+buffer with host timestamps.
+"""
+# -----------------------------------------------------------------------------
+
+import time
+import array
+
+import util
+import soc
+
+# -----------------------------------------------------------------------------
+
+_help_watch_run = (
+  ('<rate> <p.r> [p.r ...]', 'sample registers until a key is pressed'),
+  ('  rate', 'samples per second (0 = as fast as possible)'),
+  ('  p.r', 'peripheral.register - see "map" and "regs" commands'),
+)
+
+_help_watch_csv = (
+  ('<filename>', 'write the samples to a csv file'),
+)
+
+# -----------------------------------------------------------------------------
+
+# number of samples kept in the ring buffer
+_ring_size = 1 << 16
+
+# seconds between summary lines
+_summary_interval = 1.0
+
+# 32-bit unsigned array typecode
+_u32 = ('L', 'I')[array.array('I').itemsize == 4]
+
+# -----------------------------------------------------------------------------
+
+class ring(object):
+  """fixed size ring buffer of timestamped register samples"""
+
+  def __init__(self, nregs, size = _ring_size):
+    self.nregs = nregs
+    self.size = size
+    self.t = array.array('d', [0.0] * size)
+    self.vals = array.array(_u32, [0] * (size * nregs))
+    # index of the next sample, total number of samples
+    self.idx = 0
+    self.n = 0
+
+  def add(self, t, vals):
+    """add a sample"""
+    self.t[self.idx] = t
+    i = self.idx * self.nregs
+    self.vals[i:i + self.nregs] = array.array(_u32, vals)
+    self.idx = (self.idx + 1) % self.size
+    self.n += 1
+
+  def samples(self):
+    """return the buffered samples in time order [(t, vals), ...]"""
+    k = min(self.n, self.size)
+    l = []
+    for j in xrange(self.idx - k, self.idx):
+      j %= self.size
+      i = j * self.nregs
+      l.append((self.t[j], self.vals[i:i + self.nregs]))
+    return l
+
+# -----------------------------------------------------------------------------
+
+class watch(object):
+  """register watch"""
+
+  def __init__(self, cpu, device):
+    self.cpu = cpu
+    self.device = device
+    self.registers = []
+    self.names = []
+    self.ring = None
+    self.menu = (
+      ('csv', self.cmd_csv, _help_watch_csv),
+      ('run', self.cmd_run, _help_watch_run),
+    )
+
+  def register_arg(self, ui, arg):
+    """return the register for a peripheral.register argument - or None"""
+    x = arg.split('.')
+    if len(x) != 2 or not self.device.peripherals.has_key(x[0]):
+      ui.put("no register named '%s'\n" % arg)
+      return None
+    p = self.device.peripherals[x[0]]
+    if not p.registers or not p.registers.has_key(x[1]):
+      ui.put("no register named '%s'\n" % arg)
+      return None
+    return p.registers[x[1]]
+
+  def cmd_run(self, ui, args):
+    """sample registers until a key is pressed"""
+    if len(args) < 2:
+      ui.put(util.bad_argc)
+      return
+    rate = util.int_arg(ui, args[0], (0, 1000000), 10)
+    if rate is None:
+      return
+    # one column per register, drop repeated registers
+    (regs, names) = ([], [])
+    for arg in args[1:]:
+      r = self.register_arg(ui, arg)
+      if r is None:
+        return
+      if r not in regs:
+        regs.append(r)
+        names.append(arg)
+    self.registers = regs
+    self.names = names
+    self.ring = ring(len(regs))
+    spans = soc.register_spans(regs)
+    # map the span read order back to the command line order
+    order = dict([(id(r), i) for (i, r) in enumerate(regs)])
+    period = (0.0, 1.0 / max(rate, 1))[rate > 0]
+    ui.put('sampling %d registers in %d reads, press a key to stop\n' % (len(regs), len(spans)))
+    t_start = time.time()
+    t_next = t_start
+    # time and sample count at the last summary
+    (t_summary, n_summary) = (t_start, 0)
+    vals = [0] * len(regs)
+    ui.poll_begin()
+    try:
+      while True:
+        t = time.time()
+        if t >= t_next:
+          for (r, val) in soc.rd_spans(self.cpu, spans):
+            vals[order[id(r)]] = val
+          self.ring.add(t, vals)
+          t_next += period
+          if t_next < t:
+            # we can't keep up, don't try to catch up
+            t_next = t
+        if t - t_summary >= _summary_interval:
+          # summary line
+          rate_now = (self.ring.n - n_summary) / (t - t_summary)
+          ui.put('%8.2f %7.1f/s %s\n' % (t - t_start, rate_now, ' '.join(['%08x' % v for v in vals])))
+          (t_summary, n_summary) = (t, self.ring.n)
+        # check for a key press, waiting for the next sample time (up to 10 ms)
+        if ui.poll(min(max(t_next - time.time(), 0.0), 0.01)):
+          break
+    finally:
+      ui.poll_end()
+    t = time.time() - t_start
+    ui.put('%d samples in %.2f secs (%.1f/s), %d buffered\n' % (self.ring.n, t, self.ring.n / t, min(self.ring.n, self.ring.size)))
+
+  def cmd_csv(self, ui, args):
+    """write the samples to a csv file"""
+    if util.wrong_argc(ui, args, (1,)):
+      return
+    if self.ring is None or self.ring.n == 0:
+      ui.put('no samples (run "watch run")\n')
+      return
+    samples = self.ring.samples()
+    t0 = samples[0][0]
+    f = open(args[0], 'w')
+    f.write('time,%s\n' % ','.join(self.names))
+    for (t, vals) in samples:
+      f.write('%.6f,%s\n' % (t - t0, ','.join(['0x%x' % v for v in vals])))
+    f.close()
+    ui.put('%d samples written to %s\n' % (len(samples), args[0]))
+
+# -----------------------------------------------------------------------------